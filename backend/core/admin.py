@@ -1,8 +1,17 @@
 from django.contrib import admin
 from .models import *
+from .search import search
 from django.utils.html import format_html
 
 # Register your models here.
+@admin.register(Shop)
+class ShopAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug", "created_at")
+    search_fields = ("name", "slug")
+    prepopulated_fields = {"slug": ("name",)}
+    filter_horizontal = ("members",)
+
+
 class PriceHistoryInLine(admin.TabularInline):
     model =PriceHistory
     extra = 0
@@ -16,7 +25,7 @@ class PriceHistoryInLine(admin.TabularInline):
 class PriceHistoryAdmin(admin.ModelAdmin):
     list_display = ("item", "old_price", "new_price", "changed_at")
     list_filter = ("changed_at",)
-    search_fields = ("item_name",)
+    search_fields = ("item__name",)
     readonly_fields = ("item", "old_price", "new_price", "changed_at")
     
     
@@ -27,11 +36,22 @@ class TransactionItemInline(admin.TabularInline):
     
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ("customer","transaction_type", "date", "total_amount")
-    list_filter = ("transaction_type", "date")
-    search_fields = ("customer_name",)
+    list_display = ("customer","transaction_type", "date", "display_total")
+    list_filter = ("shop", "transaction_type", "date")
+    search_fields = ("customer__name",)
+    # taken from the customer on save
+    exclude = ("shop",)
     inlines = [TransactionItemInline]
     
+    def get_queryset(self, request):
+        """totals are annotated in SQL instead of loading items per row"""
+        return super().get_queryset(request).select_related("customer").with_totals()
+    
+    def display_total(self, obj):
+        return obj.amount_total
+    display_total.short_description = "Total amount"
+    display_total.admin_order_field = "amount_total"
+    
     def get_inlines(self, request, obj=None):
         """only show items inline for 'debt' transactions"""
         if obj and obj.transaction_type == "payment":
@@ -41,12 +61,18 @@ class TransactionAdmin(admin.ModelAdmin):
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ("name", "phone", "display_balance", "created_at")
+    list_filter = ("shop",)
     search_fields = ("name", "phone",)
     readonly_fields = ("balance_summary",)
+    list_select_related = ("ledger",)
+
+    def get_search_results(self, request, queryset, search_term):
+        """prefix match on the indexed search columns instead of icontains"""
+        return search(queryset, search_term, phone=True), False
 
     fieldsets = (
         (None, {
-            "fields": ("name", "phone", "balance_summary"),
+            "fields": ("shop", "name", "phone", "balance_summary"),
         }),
     )
     
@@ -62,6 +88,7 @@ class CustomerAdmin(admin.ModelAdmin):
             balance
         )
     display_balance.short_description = "Current Debt"
+    display_balance.admin_order_field = "ledger__balance"
 
     def balance_summary(self, obj):
         color = "red" if obj.total_balance > 0 else "green"
@@ -92,4 +119,8 @@ class CustomerAdmin(admin.ModelAdmin):
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     list_display = ("name", "price", "is_active")
+    list_filter = ("shop", "is_active")
     search_fields = ("name",)
+
+    def get_search_results(self, request, queryset, search_term):
+        return search(queryset, search_term), False
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+
+        from . import checks, signals  # noqa: F401
+        from .search import install_accelerators
+
+        post_migrate.connect(install_accelerators, sender=self)
+        if settings.REQUEST_METRICS:
+            from .metrics import instrument_connection
+
+            connection_created.connect(instrument_connection)
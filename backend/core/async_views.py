@@ -0,0 +1,148 @@
+"""
+Async twins of the hot read endpoints, served under /api/async/.
+
+They take the same bearer tokens and answer the same payloads as the DRF
+viewsets but await the ORM, so under
+an ASGI server (uvicorn denitrack.asgi:application) a worker keeps serving
+other clients while the database works. The serializers only format rows that
+are already loaded; nothing here touches the database synchronously.
+"""
+import base64
+import binascii
+import functools
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.utils.encoders import JSONEncoder
+
+from .auth import CachedJWTAuthentication
+from .dashboard import adashboard_metrics
+from .models import Customer
+from .search import normalize_text, search, search_ordering
+from .serializers import CustomerSerializer, CustomerSummarySerializer
+from .tenancy import arequest_shop_id
+
+
+def api_response(data, status=200):
+    # DRF's encoder, so decimals and dates render exactly as on the sync endpoints
+    return JsonResponse(data, encoder=JSONEncoder, status=status, safe=False)
+
+
+def authenticate(request):
+    """the DRF views' token check; it only verifies the signature, so it is safe to run in the event loop"""
+    result = CachedJWTAuthentication().authenticate(request)
+    if result is None:
+        raise NotAuthenticated()
+    request.user, request.auth = result
+
+
+def shop_view(view):
+    """
+    authenticate the request and resolve its shop before running an async
+    view, passed as `shop_id`; failures answer as the DRF views do
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "GET":
+            return HttpResponseNotAllowed(["GET"])
+        # never the lazy session user, loading it would be a sync query
+        request.user, request.auth = AnonymousUser(), None
+        try:
+            authenticate(request)
+            shop_id = await arequest_shop_id(request)
+        except APIException as exc:
+            response = api_response(exc.detail, status=exc.status_code)
+            if exc.status_code == 401:
+                response["WWW-Authenticate"] = CachedJWTAuthentication().authenticate_header(request)
+            return response
+        return await view(request, *args, shop_id=shop_id, **kwargs)
+    return wrapper
+
+
+def encode_cursor(customer, field, reverse=False):
+    """position after (or, reversed, before) `customer` in an ordering on (field, id)"""
+    raw = json.dumps([getattr(customer, field), customer.pk, reverse]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        value, pk, reverse = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    return value, pk, bool(reverse)
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get("page_size", settings.API_PAGE_SIZE))
+    except ValueError:
+        size = settings.API_PAGE_SIZE
+    return max(1, min(size, settings.API_MAX_PAGE_SIZE))
+
+
+@shop_view
+async def customer_list(request, shop_id):
+    """
+    GET /api/async/customers/[?search=...&cursor=...&page_size=...]
+    the summary rows and next / previous links of GET /api/customers/, keyset
+    paginated on (name, id), or on the searched column as there
+    """
+    term = request.GET.get("search")
+    customers = Customer.objects.filter(shop_id=shop_id).with_ledger()
+    # the first search on a connection looks up whether the word index is installed
+    customers = await sync_to_async(search)(customers, term, phone=True)
+    field, _ = ordering = search_ordering(term, phone=True) if normalize_text(term) else ("name", "id")
+
+    cursor, reverse = request.GET.get("cursor"), False
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return api_response({"detail": "Invalid cursor"}, status=404)
+        value, pk, reverse = position
+        lookup = "lt" if reverse else "gt"
+        customers = customers.filter(Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"pk__{lookup}": pk}))
+    customers = customers.order_by(*(f"-{name}" for name in ordering) if reverse else ordering)
+
+    size = page_size(request)
+    page = [customer async for customer in customers[: size + 1]]
+    more = len(page) > size
+    page = page[:size]
+    if reverse:
+        page.reverse()
+    # coming from a cursor there is a page on the side it came from
+    has_next, has_previous = (bool(cursor), more) if reverse else (more, bool(cursor))
+
+    def link(customer, reverse):
+        query = request.GET.copy()
+        query["cursor"] = encode_cursor(customer, field, reverse)
+        return request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+
+    return api_response({
+        "next": link(page[-1], False) if page and has_next else None,
+        "previous": link(page[0], True) if page and has_previous else None,
+        "results": CustomerSummarySerializer(page, many=True).data,
+    })
+
+
+@shop_view
+async def customer_detail(request, pk, shop_id):
+    """GET /api/async/customers/<id>/, totals and transactions as on GET /api/customers/<id>/"""
+    customers = Customer.objects.filter(shop_id=shop_id).with_totals().prefetch_related("transactions__items__item")
+    try:
+        customer = await customers.aget(pk=pk)
+    except Customer.DoesNotExist:
+        # the JSON error of the DRF view, not Django's HTML 404 page
+        return api_response({"detail": "No Customer matches the given query."}, status=404)
+    return api_response(CustomerSerializer(customer).data)
+
+
+@shop_view
+async def dashboard(request, shop_id):
+    """GET /api/async/dashboard/, the cached shop-wide metrics"""
+    return api_response(await adashboard_metrics(shop_id))
@@ -0,0 +1,106 @@
+"""
+JWT authentication for the API.
+
+Access tokens carry what a request needs to know about its user: the id, the
+username, the staff flag and the ids of the shops the user is a member of.
+CachedJWTAuthentication checks the signature and expiry and builds a TokenUser
+from those claims, so authenticating a request reads no user or membership
+rows; recently verified tokens are kept in a small in-process LRU so a client's
+next requests skip the signature check too. The claims are read from the
+database when a token is issued or refreshed, so account and membership
+changes reach the API within SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"].
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+SHOPS_CLAIM = "shops"
+
+
+def add_user_claims(token, user):
+    token["username"] = user.get_username()
+    token["is_staff"] = user.is_staff
+    token[SHOPS_CLAIM] = sorted(user.shops.values_list("pk", flat=True))
+    return token
+
+
+def token_shop_ids(token):
+    """shop ids a validated token grants, None for requests authenticated without one"""
+    if token is None or not hasattr(token, "get"):
+        return None
+    return token.get(SHOPS_CLAIM) or []
+
+
+class TokenCache:
+    """thread-safe LRU of verified tokens, keyed on the raw token"""
+
+    def __init__(self, size):
+        self.size = size
+        self.tokens = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self.lock:
+            token = self.tokens.get(raw_token)
+            if token is not None:
+                self.tokens.move_to_end(raw_token)
+            return token
+
+    def put(self, raw_token, token):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.tokens[raw_token] = token
+            self.tokens.move_to_end(raw_token)
+            while len(self.tokens) > self.size:
+                self.tokens.popitem(last=False)
+
+
+verified_tokens = TokenCache(settings.JWT_TOKEN_CACHE_SIZE)
+
+
+class CachedJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWTStatelessUserAuthentication that verifies each token once per process.
+    a cached token is reused until its exp claim passes, then verified again,
+    which rejects it
+    """
+
+    def get_validated_token(self, raw_token):
+        token = verified_tokens.get(raw_token)
+        if token is not None and token.payload.get("exp", 0) > time.time():
+            return token
+        token = super().get_validated_token(raw_token)
+        verified_tokens.put(raw_token, token)
+        return token
+
+
+class ShopTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """POST /api/token/: username and password for a refresh/access pair carrying the user's claims"""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ShopTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    POST /api/token/refresh/: a new access token, with the claims read again so
+    a user removed from a shop or deactivated loses access at the next refresh
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+        return {"access": str(add_user_claims(refresh.access_token, user))}
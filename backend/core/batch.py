@@ -0,0 +1,95 @@
+from django.db import transaction as db_transaction
+
+from .ledger import ZERO, deferred_refresh, schedule_delta
+from .models import Customer, Item, Transaction, TransactionItem
+from .rollups import line_totals, local_day, schedule_day_delta
+from .serializers import BatchTransactionSerializer
+
+
+def create_transaction_batch(entries, shop_id):
+    """
+    validate and insert a batch of offline-queued transactions into a shop.
+    entries whose key was already stored are reported as duplicates and not
+    written again, so a retried sync never double counts. all new rows are
+    inserted with two bulk_create() calls inside one atomic block.
+    returns one result dict per entry, in input order.
+    """
+    results = [None] * len(entries)
+    valid = {}
+    for index, entry in enumerate(entries):
+        serializer = BatchTransactionSerializer(data=entry)
+        if not serializer.is_valid():
+            key = entry.get("key") if isinstance(entry, dict) else None
+            results[index] = {"key": key, "status": "error", "errors": serializer.errors}
+        elif serializer.validated_data["key"] in valid:
+            results[index] = {
+                "key": serializer.validated_data["key"],
+                "status": "error",
+                "errors": {"key": ["Duplicate key within the batch."]},
+            }
+        else:
+            valid[serializer.validated_data["key"]] = (index, serializer.validated_data)
+
+    stored = dict(
+        Transaction.objects.filter(shop_id=shop_id, client_key__in=valid).values_list("client_key", "id")
+    )
+    customers = set(
+        Customer.objects.filter(shop_id=shop_id, pk__in={data["customer"] for _, data in valid.values()})
+        .values_list("pk", flat=True)
+    )
+    items = Item.objects.filter(shop_id=shop_id).in_bulk(
+        {line["item_id"] for _, data in valid.values() for line in data.get("items", [])}
+    )
+
+    pending = []
+    for key, (index, data) in valid.items():
+        lines = data.get("items", [])
+        if key in stored:
+            results[index] = {"key": key, "status": "duplicate", "id": stored[key]}
+            continue
+        errors = {}
+        if data["customer"] not in customers:
+            errors["customer"] = [f"Unknown customer id: {data['customer']}"]
+        missing = sorted({line["item_id"] for line in lines} - items.keys())
+        if missing:
+            errors["items"] = [f"Unknown item ids: {missing}"]
+        if errors:
+            results[index] = {"key": key, "status": "error", "errors": errors}
+            continue
+
+        fields = {"date": data["date"]} if "date" in data else {}
+        transaction = Transaction(
+            shop_id=shop_id,
+            client_key=key,
+            customer_id=data["customer"],
+            transaction_type=data["transaction_type"],
+            amount=data.get("amount"),
+            **fields,
+        )
+        pending.append((index, transaction, lines))
+
+    with db_transaction.atomic(), deferred_refresh():
+        Transaction.objects.bulk_create([transaction for _, transaction, _ in pending])
+        written = {
+            transaction.pk: [
+                TransactionItem(
+                    transaction=transaction,
+                    item=items[line["item_id"]],
+                    quantity=line.get("quantity", 1),
+                    unit_price=items[line["item_id"]].price,
+                )
+                for line in lines
+            ]
+            for _, transaction, lines in pending
+        }
+        TransactionItem.objects.bulk_create(line for lines in written.values() for line in lines)
+        for _, transaction, _ in pending:
+            sold = line_totals(written[transaction.pk])
+            debt = sum((value for _, value in sold.values()), ZERO)
+            paid = (transaction.amount or ZERO) if transaction.transaction_type == "payment" else ZERO
+            schedule_delta(transaction.customer_id, shop_id, debt=debt, paid=paid, date=transaction.date)
+            schedule_day_delta(shop_id, local_day(transaction.date), debt=debt, paid=paid, count=1, items=sold)
+
+    for index, transaction, _ in pending:
+        results[index] = {"key": transaction.client_key, "status": "created", "id": transaction.pk}
+    return results
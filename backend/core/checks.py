@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# how stale a worker's own copy of the dashboard may get without a shared cache
+MAX_LOCAL_DASHBOARD_TIMEOUT = 10
+
+
+@register()
+def dashboard_cache_check(app_configs, **kwargs):
+    """
+    invalidate_dashboard() deletes from the cache, which with locmem is only the
+    cache of the process that handled the write; the others serve their copy
+    until it expires
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    if backend.endswith("LocMemCache") and settings.DASHBOARD_CACHE_TIMEOUT > MAX_LOCAL_DASHBOARD_TIMEOUT:
+        return [
+            Warning(
+                f"The dashboard is cached for {settings.DASHBOARD_CACHE_TIMEOUT}s in a per-process cache, "
+                "so other workers serve stale totals after a write.",
+                hint="Set CACHE_URL or DJANGO_CACHE_DIR to a cache all workers share, "
+                f"or DASHBOARD_CACHE_TIMEOUT to {MAX_LOCAL_DASHBOARD_TIMEOUT} or less.",
+                id="core.W001",
+            )
+        ]
+    return []
@@ -0,0 +1,84 @@
+"""
+Conditional GET (ETag / Last-Modified) for list endpoints.
+
+The validators come from what /api/sync/ already relies on: every write bumps
+the row's updated_at, bulk paths included, and every delete leaves a tombstone,
+both indexed by shop. The newest of those is one query of index probes, so a
+request whose If-None-Match or If-Modified-Since still matches is answered 304
+before the list query runs or anything is serialized.
+
+As with sync tokens, a write is assumed visible SYNC_OVERLAP_SECONDS after its
+updated_at; one committed later with an older timestamp would not move the
+newest one. Lists that changed more recently than that get no validators.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .models import Shop, Tombstone
+from .tenancy import HEADER
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def last_change(shop_id, models):
+    """
+    newest updated_at or deletion among a shop's rows of `models`, EPOCH when
+    there are none. one statement, a (shop, timestamp) index probe per table
+    """
+    newest = {
+        model._meta.model_name: Subquery(
+            model.objects.filter(shop_id=OuterRef("pk")).order_by("-updated_at").values("updated_at")[:1]
+        )
+        for model in models
+    }
+    newest["deleted"] = Subquery(
+        Tombstone.objects.filter(shop_id=OuterRef("pk"), model__in=list(newest))
+        .order_by("-deleted_at").values("deleted_at")[:1]
+    )
+    stamps = Shop.objects.filter(pk=shop_id).annotate(**newest).values_list(*newest).first() or ()
+    return max((stamp for stamp in stamps if stamp is not None), default=EPOCH)
+
+
+def list_etag(request, shop_id, stamp):
+    """
+    the list for this shop as of `stamp`, rendered for this query string and
+    Accept header (pages, searches and formats differ)
+    """
+    key = "|".join((str(shop_id), stamp.isoformat(), request.get_full_path(), request.headers.get("Accept", "")))
+    return quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+
+class ConditionalListMixin:
+    """
+    answer list() with ETag and Last-Modified, or 304 when the client's copy is
+    current. `conditional_models` are the tables the list is built from; the
+    view must be shop-scoped
+    """
+
+    conditional_models = ()
+
+    def get_conditional_models(self):
+        return self.conditional_models
+
+    def list(self, request, *args, **kwargs):
+        stamp = last_change(self.shop_id, self.get_conditional_models())
+        if stamp > timezone.now() - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS):
+            return super().list(request, *args, **kwargs)
+
+        etag, last_modified = list_etag(request, self.shop_id, stamp), int(stamp.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+        # stored by the browser, revalidated on every use, never by a shared cache
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ("Authorization", HEADER))
+        return response
@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .models import Customer, CustomerLedger, Transaction
+
+CACHE_KEY = "core:dashboard"
+
+
+def ledger_aggregates():
+    return {
+        "total_debt": Sum("total_debt"),
+        "total_payments": Sum("total_payments"),
+        "outstanding": Sum("balance", filter=Q(balance__gt=0)),
+        "customers_in_debt": Count("pk", filter=Q(balance__gt=0)),
+    }
+
+
+def build_metrics(totals, customer_count, transaction_count):
+    return {
+        "customer_count": customer_count,
+        "transaction_count": transaction_count,
+        "total_debt": totals["total_debt"] or 0,
+        "total_payments": totals["total_payments"] or 0,
+        "outstanding": totals["outstanding"] or 0,
+        "customers_in_debt": totals["customers_in_debt"],
+    }
+
+
+def cache_key(shop_id):
+    return f"{CACHE_KEY}:{shop_id}"
+
+
+def compute_metrics(shop_id):
+    """shop-wide totals, summed over the shop's per-customer ledger rows in one query"""
+    return build_metrics(
+        CustomerLedger.objects.filter(customer__shop_id=shop_id).aggregate(**ledger_aggregates()),
+        Customer.objects.filter(shop_id=shop_id).count(),
+        Transaction.objects.filter(shop_id=shop_id).count(),
+    )
+
+
+async def acompute_metrics(shop_id):
+    return build_metrics(
+        await CustomerLedger.objects.filter(customer__shop_id=shop_id).aaggregate(**ledger_aggregates()),
+        await Customer.objects.filter(shop_id=shop_id).acount(),
+        await Transaction.objects.filter(shop_id=shop_id).acount(),
+    )
+
+
+def dashboard_metrics(shop_id):
+    metrics = cache.get(cache_key(shop_id))
+    if metrics is None:
+        metrics = compute_metrics(shop_id)
+        cache.set(cache_key(shop_id), metrics, settings.DASHBOARD_CACHE_TIMEOUT)
+    return metrics
+
+
+async def adashboard_metrics(shop_id):
+    metrics = await cache.aget(cache_key(shop_id))
+    if metrics is None:
+        metrics = await acompute_metrics(shop_id)
+        await cache.aset(cache_key(shop_id), metrics, settings.DASHBOARD_CACHE_TIMEOUT)
+    return metrics
+
+
+def invalidate_dashboard(shop_ids):
+    keys = [cache_key(shop_id) for shop_id in shop_ids]
+    # after commit, so a concurrent read cannot cache the pre-write totals again
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,90 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+
+from .models import Transaction, TransactionItem
+
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+CSV_COLUMNS = [
+    "transaction_id",
+    "date",
+    "customer_id",
+    "customer_name",
+    "transaction_type",
+    "amount",
+    "item_id",
+    "item_name",
+    "quantity",
+    "unit_price",
+    "line_total",
+]
+
+
+def ledger_queryset(transactions=None):
+    transactions = Transaction.objects.all() if transactions is None else transactions
+    return (
+        transactions.select_related("customer")
+        .prefetch_related(
+            Prefetch("items", queryset=TransactionItem.objects.select_related("item").order_by("pk"))
+        )
+        .order_by("date", "pk")
+    )
+
+
+def iter_ledger(transactions, chunk_size=2000):
+    """
+    yield one dict per transaction, with its line items nested.
+    .iterator() fetches and prefetches chunk_size transactions at a time, so
+    memory stays flat however long the ledger is
+    """
+    for txn in ledger_queryset(transactions).iterator(chunk_size=chunk_size):
+        yield {
+            "transaction_id": txn.pk,
+            "date": txn.date,
+            "customer_id": txn.customer_id,
+            "customer_name": txn.customer.name,
+            "transaction_type": txn.transaction_type,
+            "amount": txn.total_amount,
+            "items": [
+                {
+                    "item_id": line.item_id,
+                    "item_name": line.item.name,
+                    "quantity": line.quantity,
+                    "unit_price": line.unit_price,
+                    "line_total": line.total_price,
+                }
+                for line in txn.items.all()
+            ],
+        }
+
+
+class Echo:
+    """file-like object whose write() hands the row back to the csv writer's caller"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(entries):
+    """one csv line per line item; payments take a single line with empty item columns"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for entry in entries:
+        head = [entry[column] for column in CSV_COLUMNS[:6]]
+        for line in entry["items"] or [{}]:
+            yield writer.writerow(head + [line.get(column, "") for column in CSV_COLUMNS[6:]])
+
+
+def iter_jsonl(entries):
+    for entry in entries:
+        yield json.dumps(entry, cls=DjangoJSONEncoder) + "\n"
+
+
+def export_ledger(transactions, file_format, chunk_size=2000):
+    entries = iter_ledger(transactions, chunk_size=chunk_size)
+    return iter_csv(entries) if file_format == "csv" else iter_jsonl(entries)
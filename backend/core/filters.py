@@ -0,0 +1,32 @@
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+def parse_moment(value, param, end_of_day=False):
+    """ISO date or datetime -> aware datetime, a bare date means the start (or end) of that day"""
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        moment = day = None
+    if day is not None:
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    elif moment is None:
+        raise ValidationError({param: "Use an ISO date or datetime."})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_date_range(transactions, params):
+    """apply ?date_from= / ?date_to= (ISO date or datetime, both inclusive)"""
+    for param, lookup in (("date_from", "date__gte"), ("date_to", "date__lte")):
+        value = params.get(param)
+        if not value:
+            continue
+        moment = parse_moment(value, param, end_of_day=param == "date_to")
+        transactions = transactions.filter(**{lookup: moment})
+    return transactions
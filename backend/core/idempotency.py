@@ -0,0 +1,70 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+
+
+def fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    honour an Idempotency-Key header on create: the first successful response is
+    stored and replayed for retries until it expires, without touching the
+    transaction tables again. keys are scoped to the view's shop (core.tenancy)
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"detail": f"{HEADER} is too long."}, status=status.HTTP_400_BAD_REQUEST)
+
+        digest = fingerprint(request.data)
+        stored = IdempotencyKey.objects.filter(shop_id=self.shop_id, key=key).first()
+        if stored and stored.expires_at > timezone.now():
+            return self.replay(stored, digest)
+
+        with transaction.atomic():
+            if stored:
+                stored.delete()
+            try:
+                # claim the key before writing so a concurrent retry fails fast on the unique index
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        shop_id=self.shop_id,
+                        key=key,
+                        fingerprint=digest,
+                        status_code=status.HTTP_202_ACCEPTED,
+                        response_body={},
+                        expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                    )
+            except IntegrityError:
+                return Response(
+                    {"detail": f"A request with this {HEADER} is already in progress."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            response = super().create(request, *args, **kwargs)
+            record.status_code = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=["status_code", "response_body"])
+        return response
+
+    def replay(self, stored, digest):
+        if stored.fingerprint != digest:
+            return Response(
+                {"detail": f"{HEADER} was already used with a different payload."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(stored.response_body, status=stored.status_code, headers={"Idempotent-Replayed": "true"})
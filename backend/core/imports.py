@@ -0,0 +1,157 @@
+import csv
+import io
+
+from django.db import transaction
+from django.utils import timezone
+
+from .dashboard import invalidate_dashboard
+from .models import Customer, CustomerLedger, Item, PriceHistory
+from .search import normalize_phone
+from .serializers import CustomerImportSerializer, ItemImportSerializer
+
+BATCH_SIZE = 500
+
+
+class InvalidRows(Exception):
+    """raised with the per-row errors when any row of an import is invalid"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid rows")
+        self.errors = errors
+
+
+def read_csv(source):
+    """DictReader over an uploaded file or any binary/text stream, read lazily"""
+    if isinstance(source, io.TextIOBase):
+        return csv.DictReader(source)
+    return csv.DictReader(io.TextIOWrapper(source, encoding="utf-8-sig", newline=""))
+
+
+def validate_rows(reader, serializer_class, unique_field, normalize=None):
+    """validate every row before anything is written, keyed by `unique_field` (as `normalize` returns it)"""
+    rows, errors = {}, []
+    for line, row in enumerate(reader, start=2):
+        serializer = serializer_class(data={k: v for k, v in row.items() if k and v not in (None, "")})
+        if not serializer.is_valid():
+            errors.append({"row": line, "errors": serializer.errors})
+            continue
+        key = serializer.validated_data[unique_field]
+        if normalize is not None:
+            key = normalize(key)
+        if key and key in rows:
+            errors.append({"row": line, "errors": {unique_field: [f"Duplicate of row {rows[key][0]}."]}})
+            continue
+        rows[key or f"row-{line}"] = (line, serializer.validated_data)
+    if errors:
+        raise InvalidRows(errors)
+    return [data for _, data in rows.values()]
+
+
+def chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def import_items(source, shop_id):
+    """
+    upsert a shop's price list on Item.name and record PriceHistory for every changed
+    price, with a fixed number of bulk statements per BATCH_SIZE rows
+    """
+    rows = validate_rows(read_csv(source), ItemImportSerializer, "name")
+    items = [Item(shop_id=shop_id, **row) for row in rows]
+    for item in items:
+        item.fill_search_fields()
+
+    with transaction.atomic():
+        # the old prices are read under a row lock, so a concurrent reprice cannot
+        # change them between here and the write and leave wrong history rows
+        existing = {}
+        for names in chunks(row["name"] for row in rows):
+            existing.update(
+                (name, (pk, price))
+                for name, pk, price in Item.objects.filter(shop_id=shop_id, name__in=names)
+                .select_for_update().values_list("name", "pk", "price")
+            )
+        history = [
+            PriceHistory(item_id=existing[row["name"]][0], old_price=existing[row["name"]][1], new_price=row["price"])
+            for row in rows
+            if row["name"] in existing and existing[row["name"]][1] != row["price"]
+        ]
+        # rows without an is_active value keep the stored one, new items are active
+        flagged = [item for item, row in zip(items, rows) if "is_active" in row]
+        unflagged = [item for item, row in zip(items, rows) if "is_active" not in row]
+        for batch, fields in ((flagged, ["price", "is_active", "updated_at"]), (unflagged, ["price", "updated_at"])):
+            if batch:
+                Item.objects.bulk_create(
+                    batch, update_conflicts=True, unique_fields=["shop", "name"], update_fields=fields,
+                    batch_size=BATCH_SIZE,
+                )
+        PriceHistory.objects.bulk_create(history, batch_size=BATCH_SIZE)
+
+    updated = sum(1 for row in rows if row["name"] in existing)
+    return {"created": len(rows) - updated, "updated": updated, "price_changes": len(history)}
+
+
+def reprice_items(prices, shop_id):
+    """
+    apply {item_id: new_price} to a shop's items in one locked read, one bulk UPDATE and one bulk
+    INSERT of PriceHistory, whatever the number of items.
+    returns the repriced items, raises KeyError with the unknown ids
+    """
+    with transaction.atomic():
+        items = Item.objects.filter(shop_id=shop_id).select_for_update().in_bulk(prices)
+        missing = sorted(set(prices) - items.keys())
+        if missing:
+            raise KeyError(missing)
+
+        changed = [item for item in items.values() if item.price != prices[item.pk]]
+        history = [PriceHistory(item=item, old_price=item.price, new_price=prices[item.pk]) for item in changed]
+        now = timezone.now()
+        for item in changed:
+            item.price = item._loaded_price = prices[item.pk]
+            # bulk_update() does not apply auto_now
+            item.updated_at = now
+        Item.objects.bulk_update(changed, ["price", "updated_at"], batch_size=BATCH_SIZE)
+        PriceHistory.objects.bulk_create(history, batch_size=BATCH_SIZE)
+    return changed
+
+
+def import_customers(source, shop_id):
+    """
+    create a shop's customers, or rename its existing customer with the same phone number
+    (compared as digits only).
+    new customers get their empty ledger rows in bulk too
+    """
+    rows = validate_rows(read_csv(source), CustomerImportSerializer, "phone", normalize=normalize_phone)
+    # "0712 345 678" and "0712345678" are the same number: match on the digits, as search does
+    phones = {normalize_phone(row["phone"]) for row in rows} - {""}
+    existing = {}
+    for batch in chunks(phones):
+        # the oldest customer with the number, when there are several
+        for customer in Customer.objects.filter(shop_id=shop_id, phone_search__in=batch).order_by("-pk"):
+            existing[customer.phone_search] = customer
+
+    changed, new = [], []
+    for row in rows:
+        customer = existing.get(normalize_phone(row["phone"]) or None)
+        if customer is None:
+            new.append(Customer(shop_id=shop_id, name=row["name"], phone=row["phone"] or None))
+        elif customer.name != row["name"]:
+            customer.name = row["name"]
+            changed.append(customer)
+    for customer in changed + new:
+        customer.fill_search_fields()
+    now = timezone.now()
+    for customer in changed:
+        customer.updated_at = now
+
+    with transaction.atomic():
+        Customer.objects.bulk_update(changed, ["name", "name_search", "updated_at"], batch_size=BATCH_SIZE)
+        Customer.objects.bulk_create(new, batch_size=BATCH_SIZE)
+        CustomerLedger.objects.bulk_create(
+            [CustomerLedger(customer=customer) for customer in new], batch_size=BATCH_SIZE
+        )
+        invalidate_dashboard({shop_id})
+
+    return {"created": len(new), "updated": len(changed), "unchanged": len(rows) - len(new) - len(changed)}
@@ -0,0 +1,168 @@
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .dashboard import invalidate_dashboard
+from .models import Customer, CustomerLedger
+from .rollups import deferred_rollups
+
+ZERO = Decimal("0.00")
+
+_pending = threading.local()
+
+
+def customer_totals(customer_ids=None):
+    """
+    aggregate debt, payments and last transaction date straight from the raw rows.
+    returns {customer_id: (total_debt, total_payments, last_transaction_date)}
+    """
+    customers = Customer.objects.all()
+    if customer_ids is not None:
+        customers = customers.filter(pk__in=customer_ids)
+    rows = customers.with_totals().values_list(
+        "pk", "debt_total", "payment_total", "last_transaction_date"
+    )
+    return {pk: (debt, paid, last) for pk, debt, paid, last in rows}
+
+
+def apply_totals(ledger, totals):
+    """copy a customer_totals() entry onto a ledger row, returns True if anything changed"""
+    debt, paid, last = totals
+    values = {
+        "total_debt": debt,
+        "total_payments": paid,
+        "balance": debt - paid,
+        "last_transaction_date": last,
+    }
+    changed = False
+    for field, value in values.items():
+        if getattr(ledger, field) != value:
+            setattr(ledger, field, value)
+            changed = True
+    return changed
+
+
+def refresh_ledgers(customer_ids):
+    """
+    recompute the ledger rows of the given customers from their raw rows, after
+    edits and deletes (inserts go through apply_deltas). the ledger rows are locked before aggregating so concurrent writers for the
+    same customer serialize instead of overwriting each other's totals
+    """
+    ids = {pk for pk in customer_ids if pk is not None}
+    if not ids:
+        return
+
+    with transaction.atomic():
+        shops = dict(Customer.objects.filter(pk__in=ids).values_list("pk", "shop_id"))
+        CustomerLedger.objects.bulk_create(
+            [CustomerLedger(customer_id=pk) for pk in shops], ignore_conflicts=True
+        )
+        ledgers = list(CustomerLedger.objects.select_for_update().filter(customer_id__in=ids))
+        totals = customer_totals(ids)
+
+        changed = [
+            ledger
+            for ledger in ledgers
+            if apply_totals(ledger, totals.get(ledger.customer_id, (ZERO, ZERO, None)))
+        ]
+        now = timezone.now()
+        for ledger in changed:
+            ledger.updated_at = now
+        if changed:
+            CustomerLedger.objects.bulk_update(
+                changed,
+                ["total_debt", "total_payments", "balance", "last_transaction_date", "updated_at"],
+            )
+            # the balance is part of the customer's sync payload
+            Customer.objects.filter(pk__in=[ledger.customer_id for ledger in changed]).update(updated_at=now)
+            # bulk writes skip the model signals, the ledger is where they all meet
+            invalidate_dashboard({shops[ledger.customer_id] for ledger in changed if ledger.customer_id in shops})
+
+
+def apply_deltas(deltas):
+    """
+    add the amounts of newly inserted transactions, {customer_id: (shop_id, debt,
+    paid, date)}, onto the ledgers with one UPDATE per customer instead of
+    aggregating their history again. the increments are computed by the database,
+    so concurrent inserts for a customer add up. returns the customers that have
+    no ledger row yet, which need refresh_ledgers()
+    """
+    now = timezone.now()
+    missing = set()
+    for customer_id, (shop_id, debt, paid, last) in deltas.items():
+        values = {
+            "total_debt": F("total_debt") + debt,
+            "total_payments": F("total_payments") + paid,
+            "balance": F("balance") + (debt - paid),
+            "updated_at": now,
+        }
+        if last is not None:
+            values["last_transaction_date"] = Case(
+                When(last_transaction_date__gte=last, then=F("last_transaction_date")),
+                default=Value(last, output_field=models.DateTimeField()),
+            )
+        if not CustomerLedger.objects.filter(customer_id=customer_id).update(**values):
+            missing.add(customer_id)
+    applied = deltas.keys() - missing
+    if applied:
+        Customer.objects.filter(pk__in=applied).update(updated_at=now)
+        invalidate_dashboard({deltas[pk][0] for pk in applied})
+    return missing
+
+
+def schedule_refresh(customer_ids):
+    """refresh now, or at the end of the enclosing deferred_refresh() block"""
+    pending = getattr(_pending, "ids", None)
+    if pending is None:
+        refresh_ledgers(customer_ids)
+    else:
+        pending.update(customer_ids)
+
+
+def schedule_delta(customer_id, shop_id, debt=ZERO, paid=ZERO, date=None):
+    """
+    apply_deltas() for one inserted transaction, now or at the end of the enclosing
+    deferred_refresh() block. a customer also scheduled for a full refresh in the
+    block gets only that
+    """
+    deltas = getattr(_pending, "deltas", None)
+    if deltas is None:
+        refresh_ledgers(apply_deltas({customer_id: (shop_id, debt, paid, date)}))
+        return
+    _, pending_debt, pending_paid, last = deltas.get(customer_id, (shop_id, ZERO, ZERO, None))
+    if last is None or (date is not None and date > last):
+        last = date
+    deltas[customer_id] = (shop_id, pending_debt + debt, pending_paid + paid, last)
+
+
+@contextmanager
+def deferred_refresh():
+    """
+    collect ledger refreshes raised inside the block and run them once on exit,
+    so a multi-row write pays for one refresh per customer instead of one per row.
+    daily rollup refreshes are deferred the same way
+    """
+    if getattr(_pending, "ids", None) is not None:
+        yield
+        return
+    _pending.ids, _pending.deltas = set(), {}
+    try:
+        with deferred_rollups():
+            yield
+        ids, deltas = _pending.ids, _pending.deltas
+    finally:
+        _pending.ids = _pending.deltas = None
+    deltas = {pk: delta for pk, delta in deltas.items() if pk not in ids}
+    refresh_ledgers(ids | apply_deltas(deltas))
+
+
+def is_cascade(origin, *parents):
+    """True when a delete signal was triggered by deleting one of `parents`"""
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    return model in parents
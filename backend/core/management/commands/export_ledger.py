@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from core.exports import FORMATS, export_ledger
+from core.filters import filter_date_range
+from core.models import Transaction
+
+
+class Command(BaseCommand):
+    help = "Stream the transaction ledger, with customer and item names, as CSV or JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", dest="file_format", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--date-from", help="ISO date or datetime, inclusive")
+        parser.add_argument("--date-to", help="ISO date or datetime, inclusive")
+        parser.add_argument("--output", help="file to write, defaults to stdout")
+        parser.add_argument("--chunk-size", type=int, default=settings.EXPORT_CHUNK_SIZE)
+        parser.add_argument("--shop", type=int, default=settings.DEFAULT_SHOP_ID, help="shop id to export")
+
+    def handle(self, *args, file_format, date_from, date_to, output, chunk_size, shop, **options):
+        try:
+            transactions = filter_date_range(
+                Transaction.objects.filter(shop_id=shop), {"date_from": date_from, "date_to": date_to}
+            )
+        except ValidationError as exc:
+            raise CommandError(exc.detail)
+
+        chunks = export_ledger(transactions, file_format, chunk_size=chunk_size)
+        if not output:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+        with open(output, "w", newline="", encoding="utf-8") as stream:
+            stream.writelines(chunks)
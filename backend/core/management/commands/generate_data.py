@@ -0,0 +1,134 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from core.dashboard import invalidate_dashboard
+from core.models import Customer, CustomerLedger, Item, Shop, Transaction, TransactionItem
+
+FIRST_NAMES = (
+    "Wanjiru", "Otieno", "Achieng", "Kamau", "Njeri", "Mutua", "Chebet", "Kiprono", "Akinyi", "Mwangi",
+    "Wambui", "Omondi", "Nyambura", "Kiptoo", "Atieno", "Karanja", "Muthoni", "Onyango", "Jepchirchir", "Ndungu",
+)
+LAST_NAMES = (
+    "Kariuki", "Odhiambo", "Wafula", "Maina", "Kilonzo", "Rotich", "Owino", "Gitau", "Barasa", "Koech",
+    "Nyaga", "Ochieng", "Muriuki", "Langat", "Wekesa", "Macharia", "Auma", "Kimani", "Sang", "Mbugua",
+)
+PRODUCTS = (
+    ("Sugar", Decimal("150")), ("Maize flour", Decimal("130")), ("Wheat flour", Decimal("140")),
+    ("Rice", Decimal("180")), ("Cooking oil", Decimal("320")), ("Milk", Decimal("60")),
+    ("Bread", Decimal("65")), ("Tea leaves", Decimal("110")), ("Salt", Decimal("30")),
+    ("Bar soap", Decimal("90")), ("Eggs", Decimal("15")), ("Beans", Decimal("160")),
+    ("Paraffin", Decimal("170")), ("Matches", Decimal("5")), ("Toothpaste", Decimal("120")),
+    ("Washing powder", Decimal("95")), ("Tomatoes", Decimal("20")), ("Onions", Decimal("15")),
+    ("Airtime", Decimal("50")), ("Soda", Decimal("70")),
+)
+SIZES = (("", Decimal("1")), ("small", Decimal("0.5")), ("1kg", Decimal("1")), ("2kg", Decimal("1.9")),
+         ("5kg", Decimal("4.6")), ("family pack", Decimal("3")))
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill shops with a reproducible synthetic dataset (customers, items, years of debts with line items and "
+        "payments) for benchmarks, inserted with bulk_create in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shops", type=int, default=1, help="number of new shops to create and fill")
+        parser.add_argument("--shop", type=int, help="fill this existing shop id instead of creating shops")
+        parser.add_argument("--customers", type=int, default=500, help="customers per shop")
+        parser.add_argument("--items", type=int, default=60, help="items per shop")
+        parser.add_argument("--transactions", type=int, default=20_000, help="transactions per shop")
+        parser.add_argument("--years", type=float, default=2, help="how far back the transactions go")
+        parser.add_argument("--max-lines", type=int, default=4, help="most line items on one debt")
+        parser.add_argument("--payment-share", type=float, default=0.3, help="share of transactions that are payments")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="rows per bulk_create batch")
+        parser.add_argument("--seed", type=int, default=42, help="random seed, the same seed gives the same data")
+
+    def handle(self, *args, shops=1, shop=None, seed=42, **options):
+        if options["items"] < 1 or options["customers"] < 1:
+            raise CommandError("--items and --customers must be at least 1")
+        if shop is not None:
+            targets = list(Shop.objects.filter(pk=shop))
+            if not targets:
+                raise CommandError(f"no shop with id {shop}")
+        else:
+            first = Shop.objects.filter(slug__startswith="synthetic-").count()
+            targets = Shop.objects.bulk_create(
+                Shop(name=f"Synthetic shop {n}", slug=f"synthetic-{n}") for n in range(first, first + shops)
+            )
+
+        rng = random.Random(seed)
+        for target in targets:
+            with db_transaction.atomic():
+                counts = self.fill(target, rng, **options)
+            call_command("rebuild_rollups", shop=target.pk, stdout=StringIO())
+            self.stdout.write(f"shop {target.pk}: " + ", ".join(f"{k}: {v}" for k, v in counts.items()))
+
+        # bulk_create skips the signals that keep ledgers current
+        call_command("rebuild_ledgers", stdout=StringIO())
+        invalidate_dashboard({target.pk for target in targets})
+        self.stdout.write(self.style.SUCCESS(f"{len(targets)} shop(s) filled, ledgers and rollups rebuilt"))
+
+    def fill(self, shop, rng, *, customers, items, transactions, years, max_lines, payment_share, chunk_size,
+             **options):
+        new_items = []
+        for n in range(items):
+            product, price = PRODUCTS[n % len(PRODUCTS)]
+            size, factor = SIZES[n // len(PRODUCTS) % len(SIZES)]
+            round_ = n // (len(PRODUCTS) * len(SIZES))
+            name = " ".join(part for part in (product, size, f"#{round_ + 1}" if round_ else "") if part)
+            item = Item(shop=shop, name=name, price=(price * factor).quantize(Decimal("1")))
+            item.fill_search_fields()
+            new_items.append(item)
+        Item.objects.bulk_create(new_items, batch_size=chunk_size)
+        catalog = list(Item.objects.filter(shop=shop).values_list("pk", "price"))
+
+        new_customers = []
+        for n in range(customers):
+            customer = Customer(
+                shop=shop,
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                phone=f"07{rng.randrange(10 ** 8):08d}" if rng.random() < 0.8 else None,
+            )
+            customer.fill_search_fields()
+            new_customers.append(customer)
+        Customer.objects.bulk_create(new_customers, batch_size=chunk_size)
+        customer_ids = list(Customer.objects.filter(shop=shop).values_list("pk", flat=True))
+        CustomerLedger.objects.bulk_create(
+            (CustomerLedger(customer_id=pk) for pk in customer_ids), batch_size=chunk_size, ignore_conflicts=True,
+        )
+        # a few regulars run up most of the tab
+        weights = [1 / (rank + 1) for rank in range(len(customer_ids))]
+
+        now = timezone.now()
+        span = int(years * 365 * 24 * 60)
+        lines_created = 0
+        for offset in range(0, transactions, chunk_size):
+            batch, lines = [], []
+            for _ in range(min(chunk_size, transactions - offset)):
+                customer_id = rng.choices(customer_ids, weights)[0]
+                date = now - timedelta(minutes=rng.randint(0, span))
+                if rng.random() < payment_share:
+                    batch.append(Transaction(
+                        shop=shop, customer_id=customer_id, transaction_type="payment", date=date,
+                        amount=Decimal(rng.randrange(50, 3000, 10)),
+                    ))
+                    lines.append(())
+                    continue
+                batch.append(Transaction(shop=shop, customer_id=customer_id, transaction_type="debt", date=date))
+                lines.append(rng.sample(catalog, rng.randint(1, min(max_lines, len(catalog)))))
+            Transaction.objects.bulk_create(batch)
+            line_items = [
+                TransactionItem(transaction=txn, item_id=item_id, quantity=rng.randint(1, 5), unit_price=price)
+                for txn, picked in zip(batch, lines)
+                for item_id, price in picked
+            ]
+            TransactionItem.objects.bulk_create(line_items, batch_size=chunk_size)
+            lines_created += len(line_items)
+        return {"items": items, "customers": customers, "transactions": transactions, "line items": lines_created}
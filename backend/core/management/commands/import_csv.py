@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import InvalidRows, import_customers, import_items
+from core.models import Shop
+
+IMPORTERS = {"items": import_items, "customers": import_customers}
+
+
+class Command(BaseCommand):
+    help = "Bulk import an item price list (name,price[,is_active]) or customer book (name[,phone]) from CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORTERS))
+        parser.add_argument("path", help="CSV file with a header row")
+        parser.add_argument("--shop", type=int, default=settings.DEFAULT_SHOP_ID, help="shop id to import into")
+
+    def handle(self, *args, kind, path, shop, **options):
+        if not Shop.objects.filter(pk=shop).exists():
+            raise CommandError(f"no shop with id {shop}")
+        try:
+            with open(path, "rb") as source:
+                result = IMPORTERS[kind](source, shop)
+        except InvalidRows as exc:
+            for error in exc.errors:
+                self.stderr.write(f"row {error['row']}: {error['errors']}")
+            raise CommandError(f"{len(exc.errors)} invalid rows, nothing was imported")
+        except OSError as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(", ".join(f"{k}: {v}" for k, v in result.items())))
@@ -0,0 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Shop, Tombstone
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than SYNC_TOMBSTONE_DAYS; clients with older tokens resync fully."
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+        deleted = 0
+        # per shop, so each delete is a range on the (shop, deleted_at) index
+        for shop_id in Shop.objects.values_list("pk", flat=True):
+            deleted += Tombstone.objects.filter(shop_id=shop_id, deleted_at__lt=cutoff).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"{deleted} expired tombstones deleted"))
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.ledger import ZERO, apply_totals, customer_totals
+from core.models import Customer, CustomerLedger
+
+
+class Command(BaseCommand):
+    help = "Rebuild (or with --verify, check) the per-customer balance ledger from raw transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="only compare the stored ledger against the raw rows, do not write",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="number of customers aggregated per batch",
+        )
+
+    def handle(self, *args, verify=False, chunk_size=1000, **options):
+        customer_ids = Customer.objects.order_by("pk").values_list("pk", flat=True)
+        checked = mismatched = 0
+
+        for start in range(0, customer_ids.count(), chunk_size):
+            ids = list(customer_ids[start:start + chunk_size])
+            totals = customer_totals(ids)
+            ledgers = CustomerLedger.objects.in_bulk(ids)
+
+            missing = [CustomerLedger(customer_id=pk) for pk in ids if pk not in ledgers]
+            for ledger in missing:
+                apply_totals(ledger, totals.get(ledger.customer_id, (ZERO, ZERO, None)))
+            changed = [
+                ledger
+                for ledger in ledgers.values()
+                if apply_totals(ledger, totals.get(ledger.customer_id, (ZERO, ZERO, None)))
+            ]
+            checked += len(ids)
+            mismatched += len(changed) + len(missing)
+
+            if verify:
+                for ledger in missing:
+                    self.stdout.write(f"customer {ledger.customer_id}: ledger missing")
+                for ledger in changed:
+                    self.stdout.write(f"customer {ledger.customer_id}: ledger out of date")
+                continue
+
+            now = timezone.now()
+            for ledger in changed:
+                ledger.updated_at = now
+            CustomerLedger.objects.bulk_create(missing)
+            CustomerLedger.objects.bulk_update(
+                changed,
+                ["total_debt", "total_payments", "balance", "last_transaction_date", "updated_at"],
+            )
+            corrected = [ledger.customer_id for ledger in changed + missing]
+            Customer.objects.filter(pk__in=corrected).update(updated_at=now)
+
+        if verify and mismatched:
+            raise CommandError(f"{mismatched} of {checked} ledgers do not match the transactions")
+        action = "verified" if verify else f"rebuilt ({mismatched} corrected)"
+        self.stdout.write(self.style.SUCCESS(f"{checked} customer ledgers {action}"))
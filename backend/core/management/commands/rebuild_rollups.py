@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from core.models import DailyItemRollup, DailyRollup, Shop, Transaction
+from core.rollups import local_day, refresh_range
+
+
+class Command(BaseCommand):
+    help = "Rebuild each shop's daily and per-item rollups from raw transactions, a chunk of days at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-days",
+            type=int,
+            default=31,
+            help="number of days aggregated per batch, bounds memory use",
+        )
+        parser.add_argument("--shop", type=int, help="only rebuild this shop id")
+
+    def handle(self, *args, chunk_days=31, shop=None, **options):
+        shops = Shop.objects.order_by("pk")
+        if shop is not None:
+            shops = shops.filter(pk=shop)
+        for shop_id in shops.values_list("pk", flat=True):
+            self.rebuild(shop_id, chunk_days)
+
+    def rebuild(self, shop_id, chunk_days):
+        rollups = DailyRollup.objects.filter(shop_id=shop_id)
+        item_rollups = DailyItemRollup.objects.filter(shop_id=shop_id)
+        bounds = Transaction.objects.filter(shop_id=shop_id).aggregate(first=Min("date"), last=Max("date"))
+        if bounds["first"] is None:
+            rollups.delete()
+            item_rollups.delete()
+            self.stdout.write(self.style.SUCCESS(f"shop {shop_id}: no transactions, rollups cleared"))
+            return
+
+        first, last = local_day(bounds["first"]), local_day(bounds["last"])
+        rollups.exclude(day__range=(first, last)).delete()
+        item_rollups.exclude(day__range=(first, last)).delete()
+
+        day = first
+        while day <= last:
+            chunk_end = min(day + timedelta(days=chunk_days - 1), last)
+            refresh_range(shop_id, day, chunk_end)
+            self.stdout.write(f"shop {shop_id}: {day} .. {chunk_end}")
+            day = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"shop {shop_id}: rollups rebuilt for {first} .. {last}"))
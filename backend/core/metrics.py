@@ -0,0 +1,240 @@
+"""
+Opt-in request instrumentation, on with settings.REQUEST_METRICS.
+
+RequestMetricsMiddleware times every /api/ request. A connection execute
+wrapper counts the queries it runs and their time, and TimedSerializerMixin
+adds up the time serializers spend formatting rows (minus the queries they
+trigger). Each response gets a Server-Timing header with the numbers, and they
+go into fixed-bucket histograms per URL name and method, served in the
+Prometheus text format at /api/_metrics/ along with percentiles estimated from
+the buckets. That endpoint only exists when settings.METRICS_TOKEN is set, and
+is read with it as a bearer token.
+
+Memory stays bounded: the buckets are fixed and the series are keyed by URL
+name, at most MAX_SERIES of them. The histograms live in the process, so
+scrape each worker (or treat one worker as a sample).
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# name, help, buckets, RequestMetrics attribute
+FAMILIES = (
+    ("denitrack_request_duration_seconds", "Time to answer an API request.", SECONDS_BUCKETS, "total_time"),
+    ("denitrack_request_db_seconds", "Time an API request spent in SQL queries.", SECONDS_BUCKETS, "db_time"),
+    ("denitrack_request_serialize_seconds", "Time an API request spent in serializers.", SECONDS_BUCKETS,
+     "serialize_time"),
+    ("denitrack_request_queries", "SQL queries run by an API request.", QUERY_BUCKETS, "queries"),
+)
+QUANTILES = (0.5, 0.95, 0.99)
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+MAX_SERIES = 200
+METRICS_VIEW = "metrics"
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "db_time", "serialize_time", "total_time", "serializing")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = self.serialize_time = self.total_time = 0.0
+        self.serializing = False
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries", '
+            f"serialize;dur={self.serialize_time * 1000:.2f}, "
+            f"total;dur={self.total_time * 1000:.2f}"
+        )
+
+
+def record_query(execute, sql, params, many, context):
+    """connection execute wrapper, a pass-through outside measured requests"""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """connection_created: wrap the new connection's queries with record_query"""
+    if record_query not in connection.execute_wrappers:
+        # first, so connection.execute_wrapper() blocks still pop their own wrapper
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class TimedSerializerMixin:
+    """count the outermost to_representation() of a measured request as serializer time"""
+
+    def to_representation(self, instance):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        started, db_time = time.perf_counter(), metrics.db_time
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializing = False
+            # lazy loads inside the serializer are already counted as db time
+            metrics.serialize_time += time.perf_counter() - started - (metrics.db_time - db_time)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        copy = Histogram(self.bounds)
+        copy.counts, copy.sum, copy.count = list(self.counts), self.sum, self.count
+        return copy
+
+    def quantile(self, q):
+        """linear interpolation inside the bucket holding the rank, as Prometheus' histogram_quantile()"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    return float(self.bounds[-1])
+                lower = self.bounds[index - 1] if index else 0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return float(self.bounds[-1])
+
+
+class Registry:
+    """the histograms of every (view, method) seen by this process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def observe(self, view, method, metrics):
+        key = (view, method if method in METHODS else "OTHER")
+        with self.lock:
+            histograms = self.series.get(key)
+            if histograms is None:
+                if len(self.series) >= MAX_SERIES:
+                    key = ("other", key[1])
+                histograms = self.series.setdefault(
+                    key, [Histogram(buckets) for _, _, buckets, _ in FAMILIES]
+                )
+            for histogram, (_, _, _, attribute) in zip(histograms, FAMILIES):
+                histogram.observe(getattr(metrics, attribute))
+
+    def render(self):
+        with self.lock:
+            series = {key: [h.snapshot() for h in histograms] for key, histograms in self.series.items()}
+        lines = []
+        for index, (name, help_text, _, _) in enumerate(FAMILIES):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (view, method), histograms in sorted(series.items()):
+                histogram, labels = histograms[index], f'view="{view}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(list(histogram.bounds) + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+            quantile_name = f"{name}_quantile"
+            lines += [
+                f"# HELP {quantile_name} Percentiles of {name}, estimated from its buckets.",
+                f"# TYPE {quantile_name} gauge",
+            ]
+            for (view, method), histograms in sorted(series.items()):
+                for q in QUANTILES:
+                    value = histograms[index].quantile(q)
+                    lines.append(f'{quantile_name}{{view="{view}",method="{method}",quantile="{q}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class RequestMetricsMiddleware:
+    """measure /api/ requests, see the module docstring. works under WSGI and ASGI"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not request.path_info.startswith("/api/"):
+            return self.get_response(request)
+        metrics, started = RequestMetrics(), time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        if not request.path_info.startswith("/api/"):
+            return await self.get_response(request)
+        metrics, started = RequestMetrics(), time.perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        # a streamed body is still being produced, its time is not in here
+        metrics.total_time = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unmatched"
+        # the middleware may be listed with metrics switched off, it then adds nothing
+        if view != METRICS_VIEW and settings.REQUEST_METRICS:
+            response["Server-Timing"] = metrics.server_timing()
+            registry.observe(view, request.method, metrics)
+        return response
+
+
+def metrics_view(request):
+    """
+    GET /api/_metrics/, Prometheus text format, with settings.METRICS_TOKEN as a
+    bearer token. without a token configured there is no endpoint: the timings
+    and volumes per route are not for anonymous readers
+    """
+    if not settings.REQUEST_METRICS or not settings.METRICS_TOKEN:
+        raise Http404("Request metrics are off.")
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+        return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
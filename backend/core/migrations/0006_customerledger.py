@@ -0,0 +1,67 @@
+# Generated by Django 4.2.26 on 2026-10-18 15:54
+
+from decimal import Decimal
+from itertools import islice
+from django.db import migrations, models
+from django.db.models import DecimalField, F, Max, Q, Sum
+import django.db.models.deletion
+
+
+def backfill_ledgers(apps, schema_editor):
+    """
+    totals are aggregated per customer in the database, so memory grows with the
+    number of customers rather than transactions; ledgers are written in batches
+    """
+    Customer = apps.get_model("core", "Customer")
+    CustomerLedger = apps.get_model("core", "CustomerLedger")
+    Transaction = apps.get_model("core", "Transaction")
+    TransactionItem = apps.get_model("core", "TransactionItem")
+    zero = Decimal("0.00")
+
+    payments = {
+        row["customer_id"]: (row["paid"] or zero, row["last"])
+        for row in Transaction.objects.values("customer_id").annotate(
+            paid=Sum("amount", filter=Q(transaction_type="payment")), last=Max("date"),
+        ).order_by()
+    }
+    debts = dict(
+        TransactionItem.objects.filter(transaction__transaction_type="debt")
+        .values("transaction__customer_id")
+        .annotate(debt=Sum(F("quantity") * F("unit_price"), output_field=DecimalField(max_digits=12, decimal_places=2)))
+        .order_by()
+        .values_list("transaction__customer_id", "debt")
+    )
+
+    def ledgers():
+        for pk in Customer.objects.values_list("pk", flat=True).iterator(chunk_size=2000):
+            paid, last = payments.get(pk, (zero, None))
+            debt = debts.get(pk) or zero
+            yield CustomerLedger(
+                customer_id=pk, total_debt=debt, total_payments=paid, balance=debt - paid, last_transaction_date=last,
+            )
+
+    rows = ledgers()
+    while batch := list(islice(rows, 500)):
+        CustomerLedger.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_pricehistory_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerLedger',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ledger', serialize=False, to='core.customer')),
+                ('total_debt', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('total_payments', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('last_transaction_date', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.26 on 2026-10-18 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_customer_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='client_key',
+            field=models.CharField(blank=True, editable=False, help_text='idempotency key generated by an offline client', max_length=64, null=True, unique=True),
+        ),
+    ]
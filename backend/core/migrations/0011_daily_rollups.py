@@ -0,0 +1,89 @@
+# Generated by Django 4.2.26 on 2026-10-18 16:01
+
+from decimal import Decimal
+from itertools import islice
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    days and (day, item) pairs are aggregated in the database, in the local time
+    zone like core.rollups.local_day; rows are written in batches
+    """
+    DailyRollup = apps.get_model("core", "DailyRollup")
+    DailyItemRollup = apps.get_model("core", "DailyItemRollup")
+    Transaction = apps.get_model("core", "Transaction")
+    TransactionItem = apps.get_model("core", "TransactionItem")
+    zero = Decimal("0.00")
+
+    def write(model, rows):
+        while batch := list(islice(rows, 500)):
+            model.objects.bulk_create(batch)
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    lines = TransactionItem.objects.filter(transaction__transaction_type="debt").annotate(day=TruncDate("transaction__date"))
+    item_rows = lines.values("day", "item_id").annotate(
+        units=Sum("quantity"), value=Sum(F("quantity") * F("unit_price"), output_field=money),
+    ).order_by()
+    debt_by_day = dict(
+        lines.values("day").annotate(value=Sum(F("quantity") * F("unit_price"), output_field=money))
+        .order_by().values_list("day", "value")
+    )
+
+    write(DailyRollup, (
+        DailyRollup(
+            day=row["day"], transaction_count=row["count"],
+            payments_received=row["payments"] or zero, debt_issued=debt_by_day.get(row["day"]) or zero,
+        )
+        for row in Transaction.objects.annotate(day=TruncDate("date")).values("day").annotate(
+            count=Count("pk"), payments=Sum("amount", filter=Q(transaction_type="payment")),
+        ).order_by().iterator(chunk_size=2000)
+    ))
+    write(DailyItemRollup, (
+        DailyItemRollup(day=row["day"], item_id=row["item_id"], quantity=row["units"], revenue=row["value"] or zero)
+        for row in item_rows.iterator(chunk_size=2000)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('debt_issued', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('payments_received', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyItemRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveBigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='core.item')),
+            ],
+            options={
+                'ordering': ['day', 'item'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyitemrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'item'), name='unique_item_rollup_per_day'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
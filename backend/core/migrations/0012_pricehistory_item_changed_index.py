@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pricehistory',
+            index=models.Index(fields=['item', 'changed_at'], name='price_item_changed_idx'),
+        ),
+    ]
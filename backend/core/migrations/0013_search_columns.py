@@ -0,0 +1,47 @@
+# Generated by Django 4.2.26 on 2026-10-18 16:13
+
+from django.db import migrations, models
+
+from core.search import normalize_phone, normalize_text
+
+
+def backfill_search(apps, schema_editor):
+    Customer = apps.get_model("core", "Customer")
+    Item = apps.get_model("core", "Item")
+
+    customers = list(Customer.objects.only("pk", "name", "phone"))
+    for customer in customers:
+        customer.name_search = normalize_text(customer.name)
+        customer.phone_search = normalize_phone(customer.phone)
+    Customer.objects.bulk_update(customers, ["name_search", "phone_search"], batch_size=500)
+
+    items = list(Item.objects.only("pk", "name"))
+    for item in items:
+        item.name_search = normalize_text(item.name)
+    Item.objects.bulk_update(items, ["name_search"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_pricehistory_item_changed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='name_search',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='phone_search',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='name_search',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_search, migrations.RunPython.noop),
+    ]
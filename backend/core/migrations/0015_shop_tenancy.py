@@ -0,0 +1,246 @@
+# Generated by Django 4.2.26 on 2026-10-18 16:21
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import migrations, models
+import django.db.models.deletion
+
+import core.models
+
+# existing rows all belong to the one shop this deployment served so far
+DEFAULT_SHOP_ID = 1
+SCOPED_MODELS = ["Customer", "Item", "Transaction", "DailyRollup", "DailyItemRollup", "Tombstone", "IdempotencyKey"]
+
+
+def create_default_shop(apps, schema_editor):
+    Shop = apps.get_model("core", "Shop")
+    Shop.objects.using(schema_editor.connection.alias).get_or_create(
+        pk=DEFAULT_SHOP_ID, defaults={"slug": "default", "name": "Default shop"}
+    )
+    # the pk was given explicitly, move the id sequence past it where there is one
+    with schema_editor.connection.cursor() as cursor:
+        for statement in schema_editor.connection.ops.sequence_reset_sql(no_style(), [Shop]):
+            cursor.execute(statement)
+
+
+def assign_default_shop(apps, schema_editor):
+    for name in SCOPED_MODELS:
+        model = apps.get_model("core", name)
+        model.objects.using(schema_editor.connection.alias).filter(shop__isnull=True).update(shop_id=DEFAULT_SHOP_ID)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0014_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('members', models.ManyToManyField(blank=True, related_name='shops', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_default_shop, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='customer',
+            name='shop',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='customers', to='core.shop'),
+        ),
+        migrations.AddField(
+            model_name='dailyitemrollup',
+            name='shop',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_item_rollups', to='core.shop'),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='shop',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='core.shop'),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='shop',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.shop'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='shop',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.shop'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='shop',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.shop'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='shop',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='core.shop'),
+        ),
+        migrations.RunPython(assign_default_shop, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customer',
+            name='shop',
+            field=models.ForeignKey(default=core.models.default_shop_id, on_delete=django.db.models.deletion.CASCADE, related_name='customers', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='dailyitemrollup',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_item_rollups', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='dailyrollup',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='shop',
+            field=models.ForeignKey(default=core.models.default_shop_id, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='core.shop'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='dailyitemrollup',
+            name='unique_item_rollup_per_day',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='txn_date_idx',
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='name',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='name_search',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='phone_search',
+            field=models.CharField(default='', editable=False, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='dailyrollup',
+            name='day',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='key',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='name_search',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='deleted_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='client_key',
+            field=models.CharField(blank=True, editable=False, help_text='idempotency key generated by an offline client', max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['shop', 'name', 'id'], name='customer_shop_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['shop', 'name_search', 'id'], name='customer_shop_search_idx', opclasses=['int8_ops', 'varchar_pattern_ops', 'int8_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['shop', 'phone_search', 'id'], name='customer_shop_phone_idx', opclasses=['int8_ops', 'varchar_pattern_ops', 'int8_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['shop', 'updated_at'], name='customer_shop_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['shop', 'name_search', 'id'], name='item_shop_search_idx', opclasses=['int8_ops', 'varchar_pattern_ops', 'int8_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['shop', 'updated_at'], name='item_shop_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['shop', 'deleted_at'], name='tombstone_shop_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['shop', 'date'], name='txn_shop_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['shop', 'updated_at'], name='txn_shop_updated_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyitemrollup',
+            constraint=models.UniqueConstraint(fields=('shop', 'day', 'item'), name='unique_item_rollup_per_shop_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('shop', 'day'), name='unique_rollup_per_shop_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('shop', 'key'), name='unique_idempotency_key_per_shop'),
+        ),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.UniqueConstraint(fields=('shop', 'name'), name='unique_item_name_per_shop'),
+        ),
+        migrations.AddConstraint(
+            model_name='transaction',
+            constraint=models.UniqueConstraint(fields=('shop', 'client_key'), name='unique_client_key_per_shop'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import migrations
+
+# the shop 0015 moved the existing rows into
+DEFAULT_SHOP_ID = 1
+
+
+def join_default_shop(apps, schema_editor):
+    """every account could use the whole API before it required tokens, keep that for the default shop"""
+    Shop = apps.get_model("core", "Shop")
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    shop = Shop.objects.using(schema_editor.connection.alias).filter(pk=DEFAULT_SHOP_ID).first()
+    if shop is not None:
+        shop.members.add(*User.objects.using(schema_editor.connection.alias).values_list("pk", flat=True))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0015_shop_tenancy'),
+    ]
+
+    operations = [
+        migrations.RunPython(join_default_shop, migrations.RunPython.noop),
+    ]
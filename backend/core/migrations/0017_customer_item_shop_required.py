@@ -0,0 +1,24 @@
+# Generated by Django 4.2.26 on 2026-10-18 16:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_default_shop_members'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customers', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='shop',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.shop'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.26 on 2026-10-18 16:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_customer_item_shop_required'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['shop', 'name_search', 'id'], name='customer_search_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['shop', 'phone_search', 'id'], name='customer_phone_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['shop', 'name_search', 'id'], name='item_search_order_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.26 on 2026-10-18 17:03
+
+from django.db import migrations
+
+# LIKE prefix matches on Postgres need varchar_pattern_ops under its usual non-C
+# collations, which cannot serve ORDER BY; SQLite ignores opclasses, so there
+# the plain indexes already serve both and a copy would only slow writes
+PATTERN_INDEXES = [
+    ("customer_name_pattern_idx", "core_customer", "name_search"),
+    ("customer_phone_pattern_idx", "core_customer", "phone_search"),
+    ("item_name_pattern_idx", "core_item", "name_search"),
+]
+
+
+def create_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, table, column in PATTERN_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} (shop_id, {column} varchar_pattern_ops, id)"
+        )
+
+
+def drop_pattern_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _, _ in PATTERN_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_search_order_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='customer_shop_search_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='customer_shop_phone_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='item_shop_search_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='customer',
+            new_name='customer_shop_search_idx',
+            old_name='customer_search_order_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='customer',
+            new_name='customer_shop_phone_idx',
+            old_name='customer_phone_order_idx',
+        ),
+        migrations.RenameIndex(
+            model_name='item',
+            new_name='item_shop_search_idx',
+            old_name='item_search_order_idx',
+        ),
+        migrations.RunPython(create_pattern_indexes, drop_pattern_indexes),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.26 on 2026-10-18 17:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_search_pattern_indexes_on_postgres'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='customers', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='dailyitemrollup',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_item_rollups', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='dailyrollup',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='idempotencykey',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.shop'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='shop',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='core.shop'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date'], name='txn_date_idx'),
+        ),
+    ]
@@ -1,65 +1,292 @@
-from django.db import models
+from bisect import bisect_right
+
+from django.conf import settings
+from django.db import models, transaction
 from django.utils import timezone
 from decimal import Decimal, ROUND_HALF_UP, localcontext
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Coalesce
+
+from .search import normalize_phone, normalize_text
 
 # Create your models here.
 
+MONEY = models.DecimalField(max_digits=12, decimal_places=2)
+
+
+class Shop(models.Model):
+    """a tenant: every customer, item and transaction belongs to exactly one shop"""
+    
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(unique=True)
+    members = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="shops", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.name
+
+
+def default_shop_id():
+    """
+    shop that migration 0015 gave the rows it found, None when
+    settings.DEFAULT_SHOP_ID is unset. new rows always name their shop
+    """
+    return settings.DEFAULT_SHOP_ID or None
+
+
+class CustomerQuerySet(models.QuerySet):
+    def with_ledger(self):
+        """annotate balance and last_transaction_date from the CustomerLedger row, one join"""
+        return self.annotate(
+            balance=models.F("ledger__balance"),
+            last_transaction_date=models.F("ledger__last_transaction_date"),
+        )
+
+    def with_totals(self):
+        """
+        annotate debt_total, payment_total, balance and last_transaction_date
+        from the raw transaction rows, as correlated subqueries of one statement
+        """
+        debts = (
+            TransactionItem.objects.filter(transaction__customer=models.OuterRef("pk"))
+            .values("transaction__customer")
+            .annotate(
+                total=models.Sum(
+                    models.Case(
+                        models.When(
+                            transaction__transaction_type="debt",
+                            then=models.F("quantity") * models.F("unit_price"),
+                        ),
+                        output_field=MONEY,
+                    )
+                )
+            )
+            .values("total")
+        )
+        transactions = Transaction.objects.filter(customer=models.OuterRef("pk")).values("customer")
+        payments = transactions.annotate(
+            total=models.Sum(
+                models.Case(
+                    models.When(transaction_type="payment", then=models.F("amount")),
+                    output_field=MONEY,
+                )
+            )
+        ).values("total")
+        last_dates = transactions.annotate(last=models.Max("date")).values("last")
+
+        zero = models.Value(Decimal("0.00"), output_field=MONEY)
+        return self.annotate(
+            debt_total=Coalesce(models.Subquery(debts, output_field=MONEY), zero),
+            payment_total=Coalesce(models.Subquery(payments, output_field=MONEY), zero),
+            last_transaction_date=models.Subquery(last_dates),
+        ).annotate(
+            balance=models.ExpressionWrapper(
+                models.F("debt_total") - models.F("payment_total"), output_field=MONEY
+            ),
+        )
+
+
+def search_update_fields(update_fields, mapping):
+    """extend save(update_fields=...) with the search columns derived from the saved fields"""
+    if update_fields is None:
+        return None
+    update_fields = set(update_fields)
+    return update_fields | {column for source, column in mapping.items() if source in update_fields}
+
+
 class Customer(models.Model):
+    # no index of its own, the shop-leading ones in Meta cover lookups by shop (as on the models below)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="customers", db_index=False)
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped by every save and by ledger refreshes, drives /api/sync/
+    updated_at = models.DateTimeField(auto_now=True)
+    # normalized copies of name and phone for ?search=, see core.search
+    name_search = models.CharField(max_length=255, editable=False, default="")
+    phone_search = models.CharField(max_length=20, editable=False, default="")
+    
+    objects = CustomerQuerySet.as_manager()
+    
+    class Meta:
+        # every list, search and sync query is scoped to one shop, so each index leads with it
+        indexes = [
+            models.Index(fields=["shop", "name", "id"], name="customer_shop_name_idx"),
+            # the search matches and their result order; Postgres also gets varchar_pattern_ops
+            # copies for its LIKE prefix matches, created by migration 0019 on that backend only
+            models.Index(fields=["shop", "name_search", "id"], name="customer_shop_search_idx"),
+            models.Index(fields=["shop", "phone_search", "id"], name="customer_shop_phone_idx"),
+            models.Index(fields=["shop", "updated_at"], name="customer_shop_updated_idx"),
+        ]
     
     def __str__(self):
         return self.name
     
+    def fill_search_fields(self):
+        """bulk_create/bulk_update skip save(), callers there run this themselves"""
+        self.name_search = normalize_text(self.name)
+        self.phone_search = normalize_phone(self.phone)
+    
+    def save(self, *args, **kwargs):
+        self.fill_search_fields()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = search_update_fields(
+                kwargs["update_fields"], {"name": "name_search", "phone": "phone_search"}
+            )
+        super().save(*args, **kwargs)
+    
     @property
     def total_debt(self):
         """Sum of all debt transactions"""
-        return sum(t.total_amount for t in self.transactions.filter(transaction_type="debt"))
+        return self.ledger.total_debt
     
     @property
     def total_payments(self):
         """sum of all payments"""
-        return sum(t.total_amount for t in self.transactions.filter(transaction_type="payment"))
+        return self.ledger.total_payments
     
     @property
     def total_balance(self):
         """remaining debt to be paid"""
-        return self.total_debt - self.total_payments
+        return self.ledger.balance
+    
+    
+class CustomerLedger(models.Model):
+    """
+    running totals per customer, kept in step with transactions by core.signals
+    so balance reads never walk the transaction history
+    """
+    
+    customer = models.OneToOneField(
+        Customer, on_delete=models.CASCADE, primary_key=True, related_name="ledger"
+    )
+    total_debt = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    total_payments = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    last_transaction_date = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.customer_id}: balance {self.balance} KSH"
     
     
 class Item(models.Model):
-    name = models.CharField(max_length=100, unique=True)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="items", db_index=False)
+    name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    name_search = models.CharField(max_length=100, editable=False, default="")
+    
+    class Meta:
+        constraints = [
+            # also the index behind name-ordered item lists
+            models.UniqueConstraint(fields=["shop", "name"], name="unique_item_name_per_shop"),
+        ]
+        indexes = [
+            # see Customer for the Postgres pattern index
+            models.Index(fields=["shop", "name_search", "id"], name="item_shop_search_idx"),
+            models.Index(fields=["shop", "updated_at"], name="item_shop_updated_idx"),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.price} KSH)" 
     
+    def fill_search_fields(self):
+        self.name_search = normalize_text(self.name)
+    
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # price as loaded, so save() can detect a change without reading the row again
+        instance._loaded_price = instance.__dict__.get("price")
+        return instance
     
     def save(self, *args, **kwargs):
-        is_update = self.pk is not None
-        if is_update:
-            old_item = Item.objects.get(pk=self.pk)
-            old_price = old_item.price
-        else:
+        self.fill_search_fields()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = search_update_fields(kwargs["update_fields"], {"name": "name_search"})
+        update_fields = kwargs.get("update_fields")
+        created = self.pk is None
+        tracks_price = not created and (update_fields is None or "price" in update_fields)
+
+        with transaction.atomic():
             old_price = None
+            if tracks_price:
+                old_price = getattr(self, "_loaded_price", None)
+                if old_price is None:
+                    # instance was not loaded from the db, lock the row to read the price it replaces
+                    old_price = (
+                        Item.objects.select_for_update().filter(pk=self.pk)
+                        .values_list("price", flat=True).first()
+                    )
+            super().save(*args, **kwargs)
 
-        super().save(*args, **kwargs)
+            # Create price history only if price changed
+            if old_price is not None and old_price != self.price:
+                PriceHistory.objects.create(item=self, old_price=old_price, new_price=self.price)
+        # a save that left the price out did not store it, the next one still changes it
+        if created or tracks_price:
+            self._loaded_price = self.price
+    
+class PriceHistoryQuerySet(models.QuerySet):
+    def price_at(self, item_id, at):
+        """
+        price of an item at moment `at`: the last change up to then, else the
+        price the first later change replaced, else the current price.
+        each step is one seek on the (item, changed_at) index
+        """
+        before = (
+            self.filter(item_id=item_id, changed_at__lte=at)
+            .order_by("-changed_at", "-pk").values_list("new_price", flat=True).first()
+        )
+        if before is not None:
+            return before
+        after = (
+            self.filter(item_id=item_id, changed_at__gt=at)
+            .order_by("changed_at", "pk").values_list("old_price", flat=True).first()
+        )
+        if after is not None:
+            return after
+        return Item.objects.filter(pk=item_id).values_list("price", flat=True).first()
 
-    # Create price history only if price changed
-        if is_update and old_price != self.price:
-            try:
-                PriceHistory.objects.create(
-                item=self,
-                old_price=old_price,
-                new_price=self.price
+    def prices_at(self, pairs, items=None):
+        """
+        resolve many (item_id, at) pairs with a single query over the items and
+        their price history. returns {(item_id, at): price}, None for unknown items
+        and for items outside the `items` queryset when one is given
+        """
+        pairs = list(pairs)
+        items = Item.objects.all() if items is None else items
+        rows = (
+            items.filter(pk__in={item_id for item_id, _ in pairs})
+            .order_by("pk", "price_history__changed_at", "price_history__pk")
+            .values_list(
+                "pk", "price", "price_history__changed_at",
+                "price_history__old_price", "price_history__new_price",
             )
-            except Exception as e:
-            # Log error but do not fail saving item
-                print(f"Failed to create PriceHistory: {e}")    
-    
+        )
+        current, changes = {}, {}
+        for item_id, price, changed_at, old_price, new_price in rows:
+            current[item_id] = price
+            if changed_at is not None:
+                changes.setdefault(item_id, []).append((changed_at, old_price, new_price))
+
+        resolved = {}
+        for item_id, at in pairs:
+            history = changes.get(item_id, [])
+            index = bisect_right([changed_at for changed_at, _, _ in history], at)
+            if index:
+                resolved[(item_id, at)] = history[index - 1][2]
+            elif history:
+                resolved[(item_id, at)] = history[0][1]
+            else:
+                resolved[(item_id, at)] = current.get(item_id)
+        return resolved
+
+
 class PriceHistory(models.Model):
     """track price changes for audit"""
     
@@ -67,13 +294,48 @@ class PriceHistory(models.Model):
     old_price = models.DecimalField(max_digits=10, decimal_places=2)
     new_price = models.DecimalField(max_digits=10, decimal_places=2)
     changed_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = PriceHistoryQuerySet.as_manager()
+    
     class Meta:
         verbose_name_plural = 'price history' 
+        indexes = [
+            models.Index(fields=["item", "changed_at"], name="price_item_changed_idx"),
+        ]
         
     def __str__(self):
         return f"{self.item.name}: {self.old_price} → {self.new_price} on {self.changed_at.date()}"
     
       
+class TransactionQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        delete with the ledger and rollup refreshes of all the rows run once per
+        customer and day at the end, as in the admin's "delete selected"
+        """
+        from .ledger import deferred_refresh
+
+        with deferred_refresh():
+            return super().delete()
+
+    def with_totals(self):
+        """annotate amount_total: the payment amount, or the sum of a debt's line items"""
+        line_totals = (
+            TransactionItem.objects.filter(transaction=models.OuterRef("pk"))
+            .values("transaction")
+            .annotate(total=models.Sum(models.F("quantity") * models.F("unit_price"), output_field=MONEY))
+            .values("total")
+        )
+        zero = models.Value(Decimal("0.00"), output_field=MONEY)
+        return self.annotate(
+            amount_total=models.Case(
+                models.When(transaction_type="payment", then=Coalesce("amount", zero)),
+                default=Coalesce(models.Subquery(line_totals, output_field=MONEY), zero),
+                output_field=MONEY,
+            )
+        )
+
+
 class Transaction(models.Model):
     TRANSACTION_TYPES = [
          ("debt", "Debt Added"),
@@ -81,12 +343,50 @@ class Transaction(models.Model):
     ]
             
         
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="transactions", db_index=False)
     customer = models.ForeignKey(
         Customer, on_delete=models.CASCADE, related_name="transactions"
         )
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     date = models.DateTimeField(default=timezone.now)
     amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="used for payments only")
+    client_key = models.CharField(
+        max_length=64, null=True, blank=True, editable=False,
+        help_text="idempotency key generated by an offline client",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = TransactionQuerySet.as_manager()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["shop", "client_key"], name="unique_client_key_per_shop"),
+        ]
+        # a customer belongs to one shop, so the customer-led indexes are already per shop
+        indexes = [
+            models.Index(fields=["customer", "transaction_type"], name="txn_customer_type_idx"),
+            models.Index(fields=["customer", "date"], name="txn_customer_date_idx"),
+            models.Index(fields=["shop", "date"], name="txn_shop_date_idx"),
+            models.Index(fields=["shop", "updated_at"], name="txn_shop_updated_idx"),
+            # the admin changelist filters by date across all shops
+            models.Index(fields=["date"], name="txn_date_idx"),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember owner, date and shop as loaded so an edited transaction refreshes
+        # both the old and the new ledger / daily rollup
+        instance._loaded_customer_id = instance.__dict__.get("customer_id")
+        instance._loaded_date = instance.__dict__.get("date")
+        instance._loaded_shop_id = instance.__dict__.get("shop_id")
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # a transaction is in its customer's shop, also after moving it to another customer
+        if self.customer_id is not None:
+            self.shop_id = self.customer.shop_id
+        super().save(*args, **kwargs)
     
     def clean(self):
         if self.transaction_type == "payment":
@@ -97,6 +397,9 @@ class Transaction(models.Model):
         else:
             if self.amount not in (None, Decimal("0.00")):
                 raise ValidationError({"amount": "Debt transactions should not set 'amount' directly; use items."})
+        if self.pk and self.customer_id is not None:
+            if self.items.exclude(item__shop_id=self.customer.shop_id).exists():
+                raise ValidationError({"customer": "The line items are from another shop than this customer."})
             
     def __str__(self):
             return f"{self.customer.name} - {self.transaction_type} ({self.date.date()})"
@@ -129,4 +432,85 @@ class TransactionItem(models.Model):
     
     @property
     def total_price(self):
-        return self.quantity * self.unit_price
\ No newline at end of file
+        return self.quantity * self.unit_price
+
+
+class DailyRollup(models.Model):
+    """shop totals for one local day, maintained by core.rollups"""
+    
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="daily_rollups", db_index=False)
+    day = models.DateField()
+    debt_issued = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    payments_received = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    transaction_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ["day"]
+        constraints = [
+            models.UniqueConstraint(fields=["shop", "day"], name="unique_rollup_per_shop_day"),
+        ]
+    
+    def __str__(self):
+        return f"{self.day}: +{self.debt_issued} / -{self.payments_received} KSH"
+    
+    
+class DailyItemRollup(models.Model):
+    """units and value of one item sold on credit during one local day"""
+    
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="daily_item_rollups", db_index=False)
+    day = models.DateField()
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name="daily_rollups")
+    quantity = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    
+    class Meta:
+        ordering = ["day", "item"]
+        constraints = [
+            models.UniqueConstraint(fields=["shop", "day", "item"], name="unique_item_rollup_per_shop_day"),
+        ]
+    
+    def __str__(self):
+        return f"{self.day}: {self.item_id} x{self.quantity}"
+
+
+class Tombstone(models.Model):
+    """a deleted customer, item or transaction, kept so /api/sync/ can tell clients to drop it"""
+    
+    MODELS = [
+        ("customer", "Customer"),
+        ("item", "Item"),
+        ("transaction", "Transaction"),
+    ]
+    
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="+", db_index=False)
+    model = models.CharField(max_length=20, choices=MODELS)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=["shop", "deleted_at"], name="tombstone_shop_deleted_idx"),
+        ]
+    
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted {self.deleted_at}"
+
+
+class IdempotencyKey(models.Model):
+    """response of a transaction write, replayed when a client retries with the same key"""
+    
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="+", db_index=False)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="sha256 of the request payload")
+    status_code = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["shop", "key"], name="unique_idempotency_key_per_shop"),
+        ]
+    
+    def __str__(self):
+        return f"{self.key} ({self.status_code})"
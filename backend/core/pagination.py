@@ -0,0 +1,38 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+from .search import normalize_text, search_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    cursor pagination over an indexed ordering, so deep pages cost the same as
+    the first one. clients may ask for ?page_size= up to API_MAX_PAGE_SIZE
+    """
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class SearchablePagination(KeysetPagination):
+    """pages of ?search= results follow the normalized column the search used"""
+    search_phone = False
+
+    def get_ordering(self, request, queryset, view):
+        term = request.query_params.get("search")
+        if term and normalize_text(term):
+            return search_ordering(term, phone=self.search_phone)
+        return super().get_ordering(request, queryset, view)
+
+
+class CustomerPagination(SearchablePagination):
+    ordering = ("name", "id")
+    search_phone = True
+
+
+class ItemPagination(SearchablePagination):
+    ordering = ("name",)
+
+
+class TransactionPagination(KeysetPagination):
+    ordering = ("-date", "-id")
@@ -0,0 +1,58 @@
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import DailyItemRollup, DailyRollup
+from .rollups import ZERO
+
+PERIODS = {
+    "day": lambda field: F(field),
+    "month": lambda field: TruncMonth(field),
+}
+
+
+def in_range(queryset, first=None, last=None):
+    if first:
+        queryset = queryset.filter(day__gte=first)
+    if last:
+        queryset = queryset.filter(day__lte=last)
+    return queryset
+
+
+def totals_report(shop_id, period="day", first=None, last=None):
+    """a shop's debt issued, payments received, net and running outstanding balance per period"""
+    rows = (
+        in_range(DailyRollup.objects.filter(shop_id=shop_id), first, last)
+        .annotate(period=PERIODS[period]("day"))
+        .values("period")
+        .annotate(
+            debt_issued=Sum("debt_issued"),
+            payments_received=Sum("payments_received"),
+            transaction_count=Sum("transaction_count"),
+        )
+        .order_by("period")
+    )
+
+    outstanding = ZERO
+    if first:
+        opening = DailyRollup.objects.filter(shop_id=shop_id, day__lt=first).aggregate(
+            debt=Sum("debt_issued"), paid=Sum("payments_received")
+        )
+        outstanding = (opening["debt"] or ZERO) - (opening["paid"] or ZERO)
+
+    results = []
+    for row in rows:
+        net = row["debt_issued"] - row["payments_received"]
+        outstanding += net
+        results.append({**row, "net": net, "outstanding": outstanding})
+    return results
+
+
+def items_report(shop_id, period="day", first=None, last=None):
+    """units and value a shop sold on credit per item and period"""
+    return list(
+        in_range(DailyItemRollup.objects.filter(shop_id=shop_id), first, last)
+        .annotate(period=PERIODS[period]("day"), item_name=F("item__name"))
+        .values("period", "item", "item_name")
+        .annotate(quantity=Sum("quantity"), revenue=Sum("revenue"))
+        .order_by("period", "item_name")
+    )
@@ -0,0 +1,191 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyItemRollup, DailyRollup, Transaction, TransactionItem
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Decimal("0.00")
+
+_pending = threading.local()
+
+
+def local_day(moment):
+    return timezone.localdate(moment) if moment is not None else None
+
+
+def day_bounds(first, last):
+    """aware [start, end) datetimes covering the local days first..last"""
+    start = timezone.make_aware(datetime.combine(first, time.min))
+    end = timezone.make_aware(datetime.combine(last + timedelta(days=1), time.min))
+    return start, end
+
+
+def refresh_range(shop_id, first, last):
+    """
+    recompute one shop's rollups of the consecutive local days first..last from
+    the raw rows. the range is read through the (shop, date) index, so the cost is
+    proportional to the activity in those days, not to the whole history.
+    the day rows are locked before aggregating so concurrent writers serialize
+    """
+    start, end = day_bounds(first, last)
+    span = range((last - first).days + 1)
+
+    with transaction.atomic():
+        DailyRollup.objects.bulk_create(
+            [DailyRollup(shop_id=shop_id, day=first + timedelta(days=i)) for i in span], ignore_conflicts=True
+        )
+        rollups = {
+            rollup.day: rollup
+            for rollup in DailyRollup.objects.select_for_update().filter(shop_id=shop_id, day__range=(first, last))
+        }
+
+        totals = {
+            row["day"]: row
+            for row in Transaction.objects.filter(shop_id=shop_id, date__gte=start, date__lt=end)
+            .annotate(day=TruncDate("date"))
+            .values("day")
+            .annotate(
+                count=Count("pk"),
+                payments=Sum("amount", filter=Q(transaction_type="payment")),
+            )
+        }
+        items = [
+            DailyItemRollup(
+                shop_id=shop_id, day=row["day"], item_id=row["item_id"], quantity=row["units"], revenue=row["value"]
+            )
+            for row in TransactionItem.objects.filter(
+                transaction__shop_id=shop_id,
+                transaction__date__gte=start,
+                transaction__date__lt=end,
+                transaction__transaction_type="debt",
+            )
+            .annotate(day=TruncDate("transaction__date"))
+            .values("day", "item_id")
+            .annotate(
+                units=Sum("quantity"),
+                value=Sum(F("quantity") * F("unit_price"), output_field=MONEY),
+            )
+        ]
+
+        for day, rollup in rollups.items():
+            row = totals.get(day, {})
+            rollup.debt_issued = ZERO
+            rollup.payments_received = row.get("payments") or ZERO
+            rollup.transaction_count = row.get("count", 0)
+        for item in items:
+            rollups[item.day].debt_issued += item.revenue
+
+        DailyRollup.objects.bulk_update(
+            rollups.values(), ["debt_issued", "payments_received", "transaction_count"]
+        )
+        DailyItemRollup.objects.filter(shop_id=shop_id, day__range=(first, last)).delete()
+        DailyItemRollup.objects.bulk_create(items)
+
+
+def refresh_days(shop_id, days):
+    """recompute a shop's rollups of the given local days, one range per run of consecutive days"""
+    days = sorted({day for day in days if day is not None})
+    while days:
+        first = last = days.pop(0)
+        while days and days[0] == last + timedelta(days=1):
+            last = days.pop(0)
+        refresh_range(shop_id, first, last)
+
+
+def refresh_shop_days(shop_days):
+    """refresh_days() for a set of (shop_id, day) pairs"""
+    by_shop = {}
+    for shop_id, day in shop_days:
+        by_shop.setdefault(shop_id, set()).add(day)
+    for shop_id, days in sorted(by_shop.items()):
+        refresh_days(shop_id, days)
+
+
+def line_totals(lines):
+    """{item_id: (units, value)} of a transaction's TransactionItem rows, for schedule_day_delta()"""
+    totals = {}
+    for line in lines:
+        units, value = totals.get(line.item_id, (0, ZERO))
+        totals[line.item_id] = (units + line.quantity, value + line.quantity * line.unit_price)
+    return totals
+
+
+def apply_day_deltas(deltas):
+    """
+    add newly inserted transactions onto their days' rollups instead of
+    aggregating the days again. `deltas` is {(shop_id, day): (debt, paid, count,
+    {item_id: (units, value)})}. a day costs an insert-ignore and an UPDATE for
+    its DailyRollup, and the same for its item rows however many items it has;
+    the increments are computed by the database, so concurrent inserts add up
+    """
+    for (shop_id, day), (debt, paid, count, items) in sorted(deltas.items()):
+        DailyRollup.objects.bulk_create([DailyRollup(shop_id=shop_id, day=day)], ignore_conflicts=True)
+        DailyRollup.objects.filter(shop_id=shop_id, day=day).update(
+            debt_issued=F("debt_issued") + debt,
+            payments_received=F("payments_received") + paid,
+            transaction_count=F("transaction_count") + count,
+        )
+        if not items:
+            continue
+        DailyItemRollup.objects.bulk_create(
+            [DailyItemRollup(shop_id=shop_id, day=day, item_id=item_id) for item_id in items],
+            ignore_conflicts=True,
+        )
+        DailyItemRollup.objects.filter(shop_id=shop_id, day=day, item_id__in=items).update(
+            quantity=F("quantity") + Case(
+                *(When(item_id=item_id, then=units) for item_id, (units, _) in items.items()), default=0
+            ),
+            revenue=F("revenue") + Case(
+                *(When(item_id=item_id, then=value) for item_id, (_, value) in items.items()),
+                default=ZERO, output_field=MONEY,
+            ),
+        )
+
+
+def schedule_days(shop_id, days):
+    """refresh now, or at the end of the enclosing deferred_rollups() block"""
+    pending = getattr(_pending, "days", None)
+    if pending is None:
+        refresh_days(shop_id, days)
+    else:
+        pending.update((shop_id, day) for day in days)
+
+
+def schedule_day_delta(shop_id, day, debt=ZERO, paid=ZERO, count=0, items=None):
+    """
+    apply_day_deltas() for an inserted transaction or its lines, now or at the end
+    of the enclosing deferred_rollups() block. `items` is {item_id: (units, value)}.
+    a day also scheduled for a full refresh in the block gets only that
+    """
+    deltas = getattr(_pending, "deltas", None)
+    if deltas is None:
+        apply_day_deltas({(shop_id, day): (debt, paid, count, items or {})})
+        return
+    pending_debt, pending_paid, pending_count, pending_items = deltas.get((shop_id, day), (ZERO, ZERO, 0, {}))
+    for item_id, (units, value) in (items or {}).items():
+        pending_units, pending_value = pending_items.get(item_id, (0, ZERO))
+        pending_items[item_id] = (pending_units + units, pending_value + value)
+    deltas[(shop_id, day)] = (pending_debt + debt, pending_paid + paid, pending_count + count, pending_items)
+
+
+@contextmanager
+def deferred_rollups():
+    """like ledger.deferred_refresh(), for the daily rollups"""
+    if getattr(_pending, "days", None) is not None:
+        yield
+        return
+    _pending.days, _pending.deltas = set(), {}
+    try:
+        yield
+        days, deltas = _pending.days, _pending.deltas
+    finally:
+        _pending.days = _pending.deltas = None
+    apply_day_deltas({key: delta for key, delta in deltas.items() if key not in days})
+    refresh_shop_days(days)
@@ -0,0 +1,157 @@
+"""
+?search= for customers and items.
+
+Customer and Item keep a normalized copy of their searchable text in indexed
+columns (name_search: casefolded, accents and extra spaces dropped; phone_search:
+digits only), so a type-ahead lookup is an index range scan instead of an
+icontains scan over every row.
+
+A term matches the start of the whole name; a term made of digits and phone
+punctuation matches the start of the phone number instead. With
+settings.SEARCH_ACCELERATION, terms of MIN_WORD_PREFIX characters or more also
+match the start of any word in the name, backed by an FTS5 table on SQLite or a
+pg_trgm GIN index on Postgres. Both are installed after every migrate (SQLite
+table rebuilds drop triggers) and the plain prefix match is used wherever they
+are not available.
+
+Results are paged in the order of the searched column (search_ordering). On
+SQLite the plain (shop, column, id) index that finds the rows also returns them
+in page order. On Postgres the prefix match uses a varchar_pattern_ops copy of
+it, created there only by migration 0019, since that opclass cannot serve
+ORDER BY under a non-C collation.
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+# tables with a name_search column
+SEARCHABLE_TABLES = ("core_customer", "core_item")
+PHONE_TERM = re.compile(r"^[\d\s+()-]+$")
+# shorter word prefixes match too much of the table to be worth an index, and
+# trigrams cannot serve them at all
+MIN_WORD_PREFIX = 3
+
+_accelerated = {}
+
+
+def normalize_text(value):
+    value = unicodedata.normalize("NFKD", value or "")
+    value = "".join(char for char in value if not unicodedata.combining(char))
+    return " ".join(value.casefold().split())
+
+
+def normalize_phone(value):
+    return re.sub(r"\D", "", value or "")
+
+
+def is_phone_term(term):
+    return bool(normalize_phone(term)) and PHONE_TERM.match(term) is not None
+
+
+def search_ordering(term, phone=False):
+    """keyset ordering for a page of search results"""
+    if phone and is_phone_term(term):
+        return ("phone_search", "id")
+    return ("name_search", "id")
+
+
+def prefix_q(connection, field, prefix):
+    if connection.vendor == "sqlite":
+        # LIKE ... ESCAPE cannot use an index on SQLite, a range over the prefix can
+        return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + "\U0010ffff"})
+    return Q(**{f"{field}__startswith": prefix})
+
+
+def fts_query(words):
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def name_q(queryset, term):
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    if len(term) < MIN_WORD_PREFIX or not is_accelerated(connection, table):
+        return prefix_q(connection, "name_search", term)
+    words = term.split()
+    if connection.vendor == "sqlite":
+        matches = RawSQL(f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s", [fts_query(words)])
+        return Q(pk__in=matches)
+    condition = Q()
+    for word in words:
+        condition &= Q(name_search__regex=r"(^| )" + re.escape(word))
+    return condition
+
+
+def search(queryset, term, phone=False):
+    """filter `queryset` down to the rows matching a ?search= term"""
+    text = normalize_text(term)
+    if not text:
+        return queryset
+    if phone and is_phone_term(text):
+        connection = connections[queryset.db]
+        return queryset.filter(prefix_q(connection, "phone_search", normalize_phone(text)))
+    return queryset.filter(name_q(queryset, text))
+
+
+def is_accelerated(connection, table):
+    if not settings.SEARCH_ACCELERATION or connection.vendor not in ("sqlite", "postgresql"):
+        return False
+    key = (connection.alias, table)
+    if key not in _accelerated:
+        if connection.vendor == "sqlite":
+            sql = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s"
+            name = f"{table}_fts_au"
+        else:
+            sql = "SELECT 1 FROM pg_indexes WHERE indexname = %s"
+            name = f"{table}_name_trgm"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [name])
+            _accelerated[key] = cursor.fetchone() is not None
+    return _accelerated[key]
+
+
+def install_sqlite_fts(cursor, table):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts "
+        f"USING fts5(name_search, content='{table}', content_rowid='id')"
+    )
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s", [f"{table}_fts_au"])
+    if cursor.fetchone():
+        return
+    delete = (
+        f"INSERT INTO {table}_fts({table}_fts, rowid, name_search) "
+        "VALUES ('delete', old.id, old.name_search);"
+    )
+    insert = f"INSERT INTO {table}_fts(rowid, name_search) VALUES (new.id, new.name_search);"
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ai AFTER INSERT ON {table} BEGIN {insert} END")
+    cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_ad AFTER DELETE ON {table} BEGIN {delete} END")
+    cursor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_au AFTER UPDATE OF name_search ON {table} "
+        f"BEGIN {delete} {insert} END"
+    )
+    cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def install_accelerators(sender=None, using="default", **kwargs):
+    """post_migrate: create the FTS5 tables or trigram indexes, skipped where unsupported"""
+    connection = connections[using]
+    if not settings.SEARCH_ACCELERATION or connection.vendor not in ("sqlite", "postgresql"):
+        return
+    for table in SEARCHABLE_TABLES:
+        try:
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                if connection.vendor == "sqlite":
+                    install_sqlite_fts(cursor, table)
+                else:
+                    cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                    cursor.execute(
+                        f"CREATE INDEX IF NOT EXISTS {table}_name_trgm "
+                        f"ON {table} USING gin (name_search gin_trgm_ops)"
+                    )
+        except DatabaseError:
+            # no FTS5 in this SQLite build, or no rights to create pg_trgm: stay on prefix matching
+            pass
+        _accelerated.pop((using, table), None)
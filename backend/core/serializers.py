@@ -1,15 +1,65 @@
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
 from rest_framework import serializers
-from .models import Customer, Item, Transaction, TransactionItem
+from .ledger import deferred_refresh, schedule_delta, schedule_refresh
+from .metrics import TimedSerializerMixin
+from .rollups import line_totals, local_day, schedule_day_delta, schedule_days
+from .models import Customer, Item, PriceHistory, Transaction, TransactionItem
 
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Item
         fields = ["id", "name", "price", "is_active"]
         read_only_fields = ['id']
 
+    def validate_name(self, value):
+        # unique per shop, and the shop is not a field here for DRF to check it
+        shop_id = self.context.get("shop_id") or getattr(self.instance, "shop_id", None)
+        duplicates = Item.objects.filter(shop_id=shop_id, name=value)
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError("item with this name already exists.")
+        return value
+
+
+class ItemPriceSerializer(serializers.Serializer):
+    """one entry of PATCH /api/items/bulk-price/"""
+    id = serializers.IntegerField(min_value=1)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.00"))
+
+
+class PriceHistorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PriceHistory
+        fields = ["id", "old_price", "new_price", "changed_at"]
+
+
+class PriceLookupSerializer(TimedSerializerMixin, serializers.Serializer):
+    """one (item, at) pair of a price lookup, `price` is filled in on the way out"""
+    item = serializers.IntegerField(min_value=1)
+    at = serializers.DateTimeField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+
+class ItemImportSerializer(serializers.Serializer):
+    """one row of an item price list CSV"""
+    name = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal("0.00"))
+    # left out of the row when the file has no value, so an existing item keeps its own
+    is_active = serializers.BooleanField(required=False)
+
+
+class CustomerImportSerializer(serializers.Serializer):
+    """one row of a customer book CSV, matched to existing customers by phone"""
+    name = serializers.CharField(max_length=255)
+    phone = serializers.CharField(max_length=20, required=False, allow_blank=True, default="")
+
 
 class TransactionItemSerializer(serializers.ModelSerializer):
+    item = serializers.IntegerField(source="item_id", min_value=1)
     item_name = serializers.CharField(source="item.name", read_only=True)
     subtotal = serializers.DecimalField(
         max_digits=10, decimal_places=2, source="total_price", read_only=True
@@ -17,10 +67,28 @@ class TransactionItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = TransactionItem
         fields = ["id", "item", "item_name", "unit_price", "quantity", "subtotal"]
+        extra_kwargs = {"quantity": {"min_value": 1}}
+
+
+def check_transaction_rules(transaction_type, amount, lines):
+    """the API side of Transaction.clean"""
+    if transaction_type == "payment":
+        if lines:
+            raise serializers.ValidationError({"items": "Payment transactions should not have line items"})
+        if not amount or amount <= Decimal("0.00"):
+            raise serializers.ValidationError({"amount": "Payments must have positive amount"})
+    elif amount not in (None, Decimal("0.00")):
+        raise serializers.ValidationError(
+            {"amount": "Debt transactions should not set 'amount' directly; use items."}
+        )
 
 
-class TransactionSerializer(serializers.ModelSerializer):
-    items = TransactionItemSerializer(many=True, read_only=True)
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    debts are written together with their line items: all referenced items are
+    loaded with one in_bulk() query and the lines inserted with one bulk_create()
+    """
+    items = TransactionItemSerializer(many=True, required=False)
     customer_name = serializers.CharField(source="customer.name", read_only=True)
     total_amount = serializers.DecimalField(
     max_digits=10, decimal_places=2, read_only=True
@@ -40,11 +108,119 @@ class TransactionSerializer(serializers.ModelSerializer):
             "date",
         ]
 
+    def get_fields(self):
+        fields = super().get_fields()
+        shop_id = self.context.get("shop_id")
+        if shop_id is not None:
+            # customers of other shops read as unknown ids
+            fields["customer"].queryset = Customer.objects.filter(shop_id=shop_id)
+        return fields
+
+    def validate(self, attrs):
+        lines = attrs.get("items")
+        transaction_type = attrs.get("transaction_type", getattr(self.instance, "transaction_type", None))
+        check_transaction_rules(transaction_type, attrs.get("amount", getattr(self.instance, "amount", None)), lines)
+        # an update without `items` keeps the stored lines, which a payment may not have
+        if lines is None and transaction_type == "payment" and self.instance is not None:
+            if self.instance.items.exists():
+                raise serializers.ValidationError({
+                    "items": "Payment transactions should not have line items; send an empty items list to remove them"
+                })
+
+        # the transaction goes to its customer's shop, and so must every item on it
+        customer = attrs.get("customer", getattr(self.instance, "customer", None))
+        shop_id = customer.shop_id if customer is not None else self.context.get("shop_id")
+        if lines:
+            item_ids = {line["item_id"] for line in lines}
+            self._items = Item.objects.filter(shop_id=shop_id).in_bulk(item_ids)
+            missing = sorted(item_ids - self._items.keys())
+            if missing:
+                raise serializers.ValidationError({"items": f"Unknown item ids: {missing}"})
+        elif lines is None and self.instance is not None and shop_id != self.instance.shop_id:
+            if self.instance.items.exclude(item__shop_id=shop_id).exists():
+                raise serializers.ValidationError(
+                    {"customer": "The line items are from another shop than this customer."}
+                )
+        return attrs
+
+    def write_lines(self, transaction, lines, created=False):
+        written = TransactionItem.objects.bulk_create(
+            TransactionItem(
+                transaction=transaction,
+                item=self._items[line["item_id"]],
+                quantity=line.get("quantity", 1),
+                unit_price=self._items[line["item_id"]].price,
+            )
+            for line in lines
+        )
+        if created:
+            sold = line_totals(written)
+            debt = sum((value for _, value in sold.values()), Decimal("0.00"))
+            schedule_delta(transaction.customer_id, transaction.shop_id, debt=debt)
+            schedule_day_delta(transaction.shop_id, local_day(transaction.date), debt=debt, items=sold)
+        else:
+            schedule_refresh({transaction.customer_id})
+            schedule_days(transaction.shop_id, {local_day(transaction.date)})
+
+    def create(self, validated_data):
+        lines = validated_data.pop("items", [])
+        with db_transaction.atomic(), deferred_refresh():
+            transaction = super().create(validated_data)
+            if lines:
+                self.write_lines(transaction, lines, created=True)
+        return transaction
 
+    def update(self, instance, validated_data):
+        """a payload with `items` replaces the debt's line items"""
+        lines = validated_data.pop("items", None)
+        with db_transaction.atomic(), deferred_refresh():
+            instance = super().update(instance, validated_data)
+            if lines is not None:
+                instance.items.all().delete()
+                self.write_lines(instance, lines)
+        return instance
 
-class CustomerSerializer(serializers.ModelSerializer):
-    total_debt = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
-    total_payments = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+
+class BatchTransactionSerializer(serializers.Serializer):
+    """
+    one entry of POST /api/transactions/batch/. customers and items are plain ids
+    here; they are resolved for the whole batch at once in core.batch
+    """
+    key = serializers.CharField(max_length=64)
+    customer = serializers.IntegerField(min_value=1)
+    transaction_type = serializers.ChoiceField(choices=Transaction.TRANSACTION_TYPES)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    date = serializers.DateTimeField(required=False)
+    items = TransactionItemSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        check_transaction_rules(attrs["transaction_type"], attrs.get("amount"), attrs.get("items"))
+        return attrs
+
+
+class CustomerSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """compact row for the customers list, no nested history"""
+    balance = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True, coerce_to_string=False
+    )
+    last_transaction_date = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = Customer
+        fields = ["id", "name", "phone", "balance", "last_transaction_date"]
+
+
+class CustomerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    total_debt = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="debt_total", read_only=True, coerce_to_string=False
+    )
+    total_payments = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="payment_total", read_only=True, coerce_to_string=False
+    )
+    balance = serializers.DecimalField(
+        max_digits=12, decimal_places=2, read_only=True, coerce_to_string=False
+    )
     transactions = TransactionSerializer(many=True, read_only=True)
     last_transaction_date = serializers.DateTimeField(read_only=True)
 
@@ -58,26 +234,15 @@ class CustomerSerializer(serializers.ModelSerializer):
             "total_debt",
             "transactions",
             "total_payments",
+            "balance",
         ]
         
     def to_representation(self, instance):
-        """add computed values dynamically"""
-        data = super().to_representation(instance)
-        transactions = instance.transactions.all()
-        
-        total_debt = sum(
-            t.total_amount for t in transactions if t.transaction_type == "debt"
-        )
-        total_payments = sum(
-            t.total_amount for t in transactions if t.transaction_type == "payment"
-        )
-        
-        
-        data.update(
-            {
-                "total_debt": total_debt,
-                "total_payments": total_payments,
-                "balance": total_debt - total_payments,
-            }
-        )
-        return data
+        """totals come from Customer.objects.with_totals(), or the ledger for fresh instances"""
+        if not hasattr(instance, "balance"):
+            ledger = instance.ledger
+            instance.debt_total = ledger.total_debt
+            instance.payment_total = ledger.total_payments
+            instance.balance = ledger.balance
+            instance.last_transaction_date = ledger.last_transaction_date
+        return super().to_representation(instance)
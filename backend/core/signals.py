@@ -0,0 +1,115 @@
+from decimal import Decimal
+
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .dashboard import invalidate_dashboard
+from .ledger import is_cascade, schedule_delta, schedule_refresh
+from .rollups import local_day, schedule_day_delta, schedule_days
+from .models import Customer, CustomerLedger, Item, Shop, Tombstone, Transaction, TransactionItem
+
+
+@receiver(post_save, sender=Customer)
+def create_customer_ledger(sender, instance, created, raw=False, **kwargs):
+    """every customer starts with an empty ledger row"""
+    if created and not raw:
+        CustomerLedger.objects.get_or_create(customer=instance)
+
+
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def transaction_changed(sender, instance, created=False, raw=False, origin=None, **kwargs):
+    # a deleted shop takes its rollups and ledgers along, a deleted customer refreshes its days once
+    if raw or is_cascade(origin, Shop, Customer):
+        return
+    if created:
+        # a new row only adds to the ledger and its day, its lines add their debt as they are written
+        paid = (instance.amount or Decimal("0.00")) if instance.transaction_type == "payment" else Decimal("0.00")
+        schedule_delta(instance.customer_id, instance.shop_id, paid=paid, date=instance.date)
+        schedule_day_delta(instance.shop_id, local_day(instance.date), paid=paid, count=1)
+        return
+    loaded_day = local_day(getattr(instance, "_loaded_date", None))
+    schedule_days(instance.shop_id, {local_day(instance.date), loaded_day})
+    # moved to a customer of another shop, the old shop loses it
+    loaded_shop_id = getattr(instance, "_loaded_shop_id", None)
+    if loaded_shop_id not in (None, instance.shop_id):
+        schedule_days(loaded_shop_id, {loaded_day})
+    schedule_refresh({instance.customer_id, getattr(instance, "_loaded_customer_id", None)})
+
+
+@receiver(post_save, sender=TransactionItem)
+@receiver(post_delete, sender=TransactionItem)
+def transaction_item_changed(sender, instance, raw=False, origin=None, **kwargs):
+    # deleting the parent transaction refreshes ledger and rollups once for all its items,
+    # deleting an item once for all the transactions it was sold in (see item_deleted)
+    if raw or is_cascade(origin, Shop, Customer, Transaction, Item):
+        return
+    parent = Transaction.objects.filter(pk=instance.transaction_id)
+    if TransactionItem.transaction.is_cached(instance):
+        transaction = instance.transaction
+        shop_id, customer_id, date = transaction.shop_id, transaction.customer_id, transaction.date
+    else:
+        shop_id, customer_id, date = parent.values_list("shop_id", "customer_id", "date").first() or (None, None, None)
+    # the lines are part of the transaction's sync payload
+    parent.update(updated_at=timezone.now())
+    schedule_refresh({customer_id})
+    schedule_days(shop_id, {local_day(date)})
+
+
+@receiver(pre_delete, sender=Item)
+def collect_item_sales(sender, instance, origin=None, **kwargs):
+    """note the customers and days an item's lines counted in, before they are deleted with it"""
+    if is_cascade(origin, Shop):
+        return
+    sales = Transaction.objects.filter(items__item=instance)
+    instance._sold_to = set(sales.values_list("customer_id", flat=True).distinct())
+    instance._sold_on = set(sales.annotate(day=TruncDate("date")).values_list("day", flat=True).distinct())
+    if instance._sold_to:
+        # the lines are part of the transactions' sync payload
+        sales.update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, origin=None, **kwargs):
+    if is_cascade(origin, Shop):
+        return
+    schedule_refresh(getattr(instance, "_sold_to", ()))
+    schedule_days(instance.shop_id, getattr(instance, "_sold_on", ()))
+
+
+@receiver(pre_delete, sender=Customer)
+def collect_customer_days(sender, instance, origin=None, **kwargs):
+    """note the days a customer's transactions counted in, before they are deleted with it"""
+    if is_cascade(origin, Shop):
+        return
+    days = Transaction.objects.filter(customer=instance).annotate(day=TruncDate("date"))
+    instance._active_on = set(days.values_list("day", flat=True).distinct())
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, origin=None, **kwargs):
+    # its ledger went with it, only the shop's rollups need the transactions taken out
+    if is_cascade(origin, Shop):
+        return
+    schedule_days(instance.shop_id, getattr(instance, "_active_on", ()))
+
+
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=Transaction)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    # a customer's tombstone stands for its transactions too, and a deleted shop has no one left to sync
+    if is_cascade(origin, Shop) or (sender is Transaction and is_cascade(origin, Customer)):
+        return
+    Tombstone.objects.create(shop_id=instance.shop_id, model=sender._meta.model_name, object_id=instance.pk)
+
+
+# line item edits reach the dashboard through the ledger refresh they trigger
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def dashboard_changed(sender, instance, **kwargs):
+    invalidate_dashboard({instance.shop_id})
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Customer, Item, Tombstone, Transaction
+from .serializers import CustomerSummarySerializer, ItemSerializer, TransactionSerializer
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def parse_token(token):
+    moment = parse_datetime(token or "")
+    if moment is None:
+        raise InvalidToken(token)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def sync_querysets(shop_id):
+    return {
+        "customers": (
+            Customer.objects.filter(shop_id=shop_id).with_ledger().order_by("pk"),
+            CustomerSummarySerializer,
+        ),
+        "items": (Item.objects.filter(shop_id=shop_id).order_by("pk"), ItemSerializer),
+        "transactions": (
+            Transaction.objects.filter(shop_id=shop_id).select_related("customer").prefetch_related("items__item").order_by("pk"),
+            TransactionSerializer,
+        ),
+    }
+
+
+def changes_since(shop_id, token=None):
+    """
+    a shop's rows created, edited or deleted since `token` (as returned by the previous
+    sync), plus the token for the next one. without a token, or one older than
+    the tombstones are kept for, everything is returned with full=True and the
+    client should replace its store.
+
+    the next token starts SYNC_OVERLAP_SECONDS before this sync, so rows written
+    by transactions still in flight now are sent again next time rather than
+    missed; clients apply the payload as upserts, repeats are harmless
+    """
+    started = timezone.now()
+    since = parse_token(token) if token else None
+    full = since is None or since < started - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+
+    payload = {
+        "token": (started - timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)).isoformat(),
+        "full": full,
+    }
+    for name, (queryset, serializer_class) in sync_querysets(shop_id).items():
+        if not full:
+            queryset = queryset.filter(updated_at__gte=since)
+        payload[name] = serializer_class(queryset, many=True).data
+
+    deleted = {"customers": [], "items": [], "transactions": []}
+    if not full:
+        for model, object_id in (
+            Tombstone.objects.filter(shop_id=shop_id, deleted_at__gte=since).values_list("model", "object_id")
+        ):
+            deleted[f"{model}s"].append(object_id)
+    payload["deleted"] = deleted
+    return payload
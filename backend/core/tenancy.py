@@ -0,0 +1,115 @@
+"""
+Which shop a request acts on.
+
+Clients name the shop in an X-Shop-ID header; without one the request falls
+back to settings.DEFAULT_SHOP_ID, or to the only shop of a single-shop user.
+An access token lists the user's shops (core.auth), so for token-authenticated
+requests this is decided without touching the database. Viewsets mix in
+ShopScopedMixin: their querysets only ever see the rows of that shop and new
+rows are created in it.
+"""
+from django.conf import settings
+from rest_framework.exceptions import NotFound, ValidationError
+
+from .auth import token_shop_ids
+from .models import Shop
+
+HEADER = "X-Shop-ID"
+
+
+def parse_shop_header(request):
+    """shop id named by the request, None without the header"""
+    value = request.headers.get(HEADER)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValidationError({HEADER: "A shop id is required."})
+    return int(value)
+
+
+def pick_shop(requested, granted):
+    """the shop of a token-authenticated request, from the shops its token grants"""
+    if requested is None:
+        if settings.DEFAULT_SHOP_ID and settings.DEFAULT_SHOP_ID in granted:
+            return settings.DEFAULT_SHOP_ID
+        if len(granted) == 1:
+            return granted[0]
+        raise ValidationError({HEADER: "This header is required."})
+    if requested not in granted:
+        raise NotFound("Unknown shop.")
+    return requested
+
+
+def member_shops(request, requested):
+    """
+    for requests authenticated without a token: the shop id and a queryset
+    that is empty unless the user may act on it
+    """
+    shop_id = requested or settings.DEFAULT_SHOP_ID
+    if not shop_id:
+        raise ValidationError({HEADER: "This header is required."})
+    shops = Shop.objects.filter(pk=shop_id)
+    user = getattr(request, "user", None)
+    if user is None or not user.is_authenticated:
+        return shop_id, shops.none()
+    if not user.is_superuser:
+        shops = shops.filter(members=user.pk)
+    return shop_id, shops
+
+
+def request_shop_id(request):
+    """id of the shop `request` acts on, resolved once per request"""
+    shop_id = getattr(request, "_shop_id", None)
+    if shop_id is not None:
+        return shop_id
+    requested = parse_shop_header(request)
+    granted = token_shop_ids(getattr(request, "auth", None))
+    if granted is not None:
+        shop_id = pick_shop(requested, granted)
+    else:
+        shop_id, shops = member_shops(request, requested)
+        if not shops.exists():
+            raise NotFound("Unknown shop.")
+    request._shop_id = shop_id
+    return shop_id
+
+
+async def arequest_shop_id(request):
+    """request_shop_id for the async views"""
+    shop_id = getattr(request, "_shop_id", None)
+    if shop_id is not None:
+        return shop_id
+    requested = parse_shop_header(request)
+    granted = token_shop_ids(getattr(request, "auth", None))
+    if granted is not None:
+        shop_id = pick_shop(requested, granted)
+    else:
+        shop_id, shops = member_shops(request, requested)
+        if not await shops.aexists():
+            raise NotFound("Unknown shop.")
+    request._shop_id = shop_id
+    return shop_id
+
+
+class ShopScopedMixin:
+    """
+    limit a view's queryset to the request's shop and create rows in it. the
+    shop id also reaches the serializers through their context, for validating
+    related rows
+    """
+
+    @property
+    def shop_id(self):
+        return request_shop_id(self.request)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(shop_id=self.shop_id)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if getattr(self, "request", None) is not None:
+            context["shop_id"] = self.shop_id
+        return context
+
+    def perform_create(self, serializer):
+        serializer.save(shop_id=self.shop_id)
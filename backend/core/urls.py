@@ -1,6 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CustomerViewSet, ItemViewSet, TransactionViewSet
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from . import async_views, metrics
+from .views import (
+    CustomerViewSet, DashboardView, ItemReportView, ItemViewSet, ReportView, SyncView, TransactionViewSet,
+)
 
 router = DefaultRouter()
 router.register(r'customers', CustomerViewSet)
@@ -10,5 +14,15 @@ router.register(r'transactions', TransactionViewSet)
 
 
 urlpatterns = [
+    path('token/', TokenObtainPairView.as_view(), name='token-obtain'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('reports/', ReportView.as_view(), name='reports'),
+    path('reports/items/', ItemReportView.as_view(), name='item-reports'),
+    path('async/customers/', async_views.customer_list, name='async-customer-list'),
+    path('async/customers/<int:pk>/', async_views.customer_detail, name='async-customer-detail'),
+    path('async/dashboard/', async_views.dashboard, name='async-dashboard'),
+    path('_metrics/', metrics.metrics_view, name=metrics.METRICS_VIEW),
     path('', include(router.urls)),
 ]
@@ -1,76 +1,304 @@
+import csv
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
-from rest_framework import viewsets, status
+from django.utils.dateparse import parse_date
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import Customer, Item, Transaction, TransactionItem
-from .serializers import (CustomerSerializer, ItemSerializer, TransactionSerializer, )
+from rest_framework.parsers import MultiPartParser
+from rest_framework.views import APIView
+from .batch import create_transaction_batch
+from .conditional import ConditionalListMixin
+from .dashboard import dashboard_metrics
+from .exports import FORMATS, export_ledger
+from .filters import filter_date_range, parse_moment
+from .imports import InvalidRows, import_customers, import_items, reprice_items
+from .reports import PERIODS, items_report, totals_report
+from .search import search
+from .sync import InvalidToken, changes_since
+from .tenancy import ShopScopedMixin, request_shop_id
+from .idempotency import IdempotentCreateMixin
+from .models import Customer, Item, PriceHistory, Transaction
+from .pagination import CustomerPagination, ItemPagination, TransactionPagination
+from .serializers import (
+    CustomerSerializer, CustomerSummarySerializer, ItemPriceSerializer, ItemSerializer,
+    PriceHistorySerializer, PriceLookupSerializer, TransactionSerializer,
+)
 
 # Create your views here.
-class ItemViewSet(viewsets.ModelViewSet):
+def csv_import_response(request, importer):
+    """run an importer over the uploaded `file` into the request's shop, reporting every invalid row"""
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response({"detail": "Upload the CSV as a 'file' form field."}, status=400)
+    try:
+        return Response(importer(upload.file, request_shop_id(request)))
+    except InvalidRows as exc:
+        return Response({"errors": exc.errors}, status=400)
+    except (UnicodeDecodeError, csv.Error) as exc:
+        return Response({"detail": f"Unreadable CSV: {exc}"}, status=400)
+
+
+def history_response(view, transactions):
+    """one cursor page of transactions, with customers and items loaded in a fixed number of queries"""
+    transactions = filter_date_range(transactions, view.request.query_params)
+    paginator = TransactionPagination()
+    page = paginator.paginate_queryset(transactions, view.request, view=view)
+    data = TransactionSerializer(page, many=True, context=view.get_serializer_context()).data
+    return paginator.get_paginated_response(data)
+
+
+class ItemViewSet(ConditionalListMixin, ShopScopedMixin, viewsets.ModelViewSet):
     """
     list, create, update, delete items. 
     shop owner uses this to manage the pre-loaded price list
     """
     queryset = Item.objects.all().order_by("name")
     serializer_class = ItemSerializer
-    
-    
-        
-        
-    
-class TransactionViewSet(viewsets.ModelViewSet):
+    conditional_models = (Item,)
+    pagination_class = ItemPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            # ?search= matches the start of the name (or of any word in it, when accelerated)
+            queryset = search(queryset, self.request.query_params.get("search"))
+        return queryset
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_csv(self, request):
+        """
+        POST /api/items/import/ with a CSV `file`: name,price[,is_active]
+        upserts on name and records price history for changed prices
+        """
+        return csv_import_response(request, import_items)
+
+    @action(detail=False, methods=["patch"], url_path="bulk-price")
+    def bulk_price(self, request):
+        """
+        PATCH /api/items/bulk-price/ with [{"id": 1, "price": "120.00"}, ...]
+        reprices many items and records their price history in a constant number of queries
+        """
+        serializer = ItemPriceSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        prices = {entry["id"]: entry["price"] for entry in serializer.validated_data}
+        try:
+            changed = reprice_items(prices, self.shop_id)
+        except KeyError as exc:
+            raise ValidationError({"id": f"Unknown item ids: {exc.args[0]}"})
+        return Response({
+            "updated": ItemSerializer(changed, many=True).data,
+            "unchanged": len(prices) - len(changed),
+        })
+
+    @action(detail=True, methods=["get"], url_path="price-history")
+    def price_history(self, request, pk=None):
+        """
+        GET /api/items/<id>/price-history/ lists the price changes, newest first.
+        with ?at=<ISO date or datetime> returns the price in effect at that moment
+        (a bare date means the end of that day)
+        """
+        item = self.get_object()
+        at = request.query_params.get("at")
+        if at:
+            moment = parse_moment(at, "at", end_of_day=True)
+            price = PriceHistory.objects.price_at(item.pk, moment)
+            return Response(PriceLookupSerializer({"item": item.pk, "at": moment, "price": price}).data)
+        history = item.price_history.order_by("-changed_at", "-pk")
+        return Response(PriceHistorySerializer(history, many=True).data)
+
+    @action(detail=False, methods=["post"], url_path="prices-at")
+    def prices_at(self, request):
+        """
+        POST /api/items/prices-at/ with [{"item": 1, "at": "2024-05-01T10:00:00Z"}, ...]
+        resolves every pair with one query, e.g. to audit the unit prices of a month of sales
+        """
+        serializer = PriceLookupSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        pairs = [(entry["item"], entry["at"]) for entry in serializer.validated_data]
+        prices = PriceHistory.objects.prices_at(pairs, items=self.get_queryset())
+        unknown = sorted({item_id for (item_id, _), price in prices.items() if price is None})
+        if unknown:
+            raise ValidationError({"item": f"Unknown item ids: {unknown}"})
+        rows = [{"item": item_id, "at": at, "price": prices[(item_id, at)]} for item_id, at in pairs]
+        return Response(PriceLookupSerializer(rows, many=True).data)
+
+
+class TransactionViewSet(IdempotentCreateMixin, ShopScopedMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all().select_related("customer").prefetch_related("items__item")
     serializer_class = TransactionSerializer
+    pagination_class = TransactionPagination
 
-    def create(self, request, *args, **kwargs):
-        data = request.data.copy()
-        items_data = data.pop("items", [])
+    def perform_create(self, serializer):
+        transaction = serializer.save(shop_id=self.shop_id)
+        # re-read through the viewset queryset so the response is built from prefetched rows
+        serializer.instance = self.get_queryset().get(pk=transaction.pk)
 
-        # Create the transaction
-        serializer = self.get_serializer(data=data)
-        serializer.is_valid(raise_exception=True)
-        transaction = serializer.save()
-
-        # Only create TransactionItem objects for debt
-        if transaction.transaction_type == "debt":
-            for item in items_data:
-                TransactionItem.objects.create(
-                    transaction=transaction,
-                    item_id=item["item"],
-                    quantity=item.get("quantity", 1),
-                    unit_price=Item.objects.get(id=item["item"]).price
-                )
-
-        headers = self.get_success_headers(serializer.data)
-        return Response(self.get_serializer(transaction).data, status=status.HTTP_201_CREATED, headers=headers)
-    
-@action(detail=False, methods=["get"])
-def by_customer(self, request):
-    """
-    optional endpoint: api/transactions/by_customer/?customer_id=1
-    returns all transactions for a customer with id 1
-    """
-    customer_id = request.query_params.get("customer_id")
-    if not customer_id:
-        return Response({"detail": "customer_id is required"}, status=400)
-    qs = self.queryset.filter(customer_id=customer_id)
-    return Response(self.get_serializer(qs, many=True).data)
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """
+        POST /api/transactions/batch/
+        body: a list of transactions, each with a client generated "key".
+        returns {"results": [...]} with a created/duplicate/error entry per input
+        """
+        entries = request.data
+        if not isinstance(entries, list):
+            return Response({"detail": "Expected a list of transactions."}, status=400)
+        if len(entries) > settings.TRANSACTION_BATCH_LIMIT:
+            return Response(
+                {"detail": f"At most {settings.TRANSACTION_BATCH_LIMIT} transactions per batch."},
+                status=400,
+            )
+        try:
+            results = create_transaction_batch(entries, self.shop_id)
+        except IntegrityError:
+            # a concurrent retry stored one of the keys first, the client can simply resend
+            return Response({"detail": "Batch conflicted with a concurrent sync, retry."}, status=409)
+        return Response({"results": results})
 
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        GET /api/transactions/export/?output=csv|jsonl[&date_from=...&date_to=...]
+        streams the whole ledger with customer and item names, oldest first
+        """
+        output = request.query_params.get("output", "csv")
+        if output not in FORMATS:
+            raise ValidationError({"output": f"Choose one of: {', '.join(FORMATS)}."})
+        transactions = filter_date_range(Transaction.objects.filter(shop_id=self.shop_id), request.query_params)
+        response = StreamingHttpResponse(
+            export_ledger(transactions, output, chunk_size=settings.EXPORT_CHUNK_SIZE),
+            content_type=FORMATS[output],
+        )
+        response["Content-Disposition"] = f'attachment; filename="ledger.{output}"'
+        return response
 
-class CustomerViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["get"])
+    def by_customer(self, request):
+        """
+        GET /api/transactions/by_customer/?customer_id=1[&date_from=...&date_to=...]
+        paginated history of one customer, newest first
+        """
+        customer_id = request.query_params.get("customer_id")
+        if not customer_id or not customer_id.isdigit():
+            return Response({"detail": "customer_id is required"}, status=400)
+        transactions = self.get_queryset().filter(customer_id=customer_id)
+        return history_response(self, transactions)
+    
+class CustomerViewSet(ConditionalListMixin, ShopScopedMixin, viewsets.ModelViewSet):
     """
     CRUD + summary for customers.
-    Includes computed totals and transactions.
+    The list returns compact summary rows; the detail route (or ?expand=transactions
+    on the list) includes computed totals and transactions.
     """
-    queryset = Customer.objects.all().prefetch_related("transactions__items__item")
+    queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
+    pagination_class = CustomerPagination
+
+    def get_conditional_models(self):
+        # ledger refreshes bump the customer row, so totals are covered by it alone
+        if self.expands_transactions():
+            return (Customer, Transaction, Item)
+        return (Customer,)
+
+    def expands_transactions(self):
+        expand = self.request.query_params.get("expand", "")
+        return self.action != "list" or "transactions" in expand.split(",")
+
+    def get_queryset(self):
+        if self.action == "transactions":
+            # only the customer row is needed, the history is paged separately
+            return Customer.objects.filter(shop_id=self.shop_id)
+        queryset = super().get_queryset()
+        if self.action == "list":
+            # ?search= is a name prefix, or a phone number prefix when it looks like one
+            queryset = search(queryset, self.request.query_params.get("search"), phone=True)
+        if self.expands_transactions():
+            return queryset.with_totals().prefetch_related("transactions__items__item")
+        # the summary rows read the ledger, not the history behind it
+        return queryset.with_ledger()
+
+    def get_serializer_class(self):
+        if self.expands_transactions():
+            return CustomerSerializer
+        return CustomerSummarySerializer
+
+    @action(detail=False, methods=["post"], url_path="import", parser_classes=[MultiPartParser])
+    def import_csv(self, request):
+        """
+        POST /api/customers/import/ with a CSV `file`: name[,phone]
+        """
+        return csv_import_response(request, import_customers)
 
     @action(detail=True, methods=["get"])
     def transactions(self, request, pk=None):
         """
-        GET /api/customers/<id>/transactions/
+        GET /api/customers/<id>/transactions/[?date_from=...&date_to=...]
         """
         customer = self.get_object()
-        transactions = customer.transactions.all()
-        data = TransactionSerializer(transactions, many=True).data
-        return Response(data)
\ No newline at end of file
+        transactions = (
+            Transaction.objects.filter(customer=customer)
+            .select_related("customer")
+            .prefetch_related("items__item")
+        )
+        return history_response(self, transactions)
+
+
+class DashboardView(APIView):
+    """
+    GET /api/dashboard/
+    shop-wide customer count, debt and repayments, cached until the next write
+    """
+
+    def get(self, request):
+        return Response(dashboard_metrics(request_shop_id(request)))
+
+
+
+class SyncView(APIView):
+    """
+    GET /api/sync/[?since=<token>]
+    customers, items and transactions changed since the token of the previous
+    sync, the ids deleted since then, and the token to send next time
+    """
+
+    def get(self, request):
+        try:
+            return Response(changes_since(request_shop_id(request), request.query_params.get("since")))
+        except InvalidToken:
+            raise ValidationError({"since": "Use the token returned by the previous sync."})
+
+
+class ReportView(APIView):
+    """
+    GET /api/reports/?period=day|month&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD
+    served from the daily rollup tables, never from the raw transactions
+    """
+    report = staticmethod(totals_report)
+
+    def get(self, request):
+        period = request.query_params.get("period", "day")
+        if period not in PERIODS:
+            raise ValidationError({"period": f"Choose one of: {', '.join(PERIODS)}."})
+        bounds = {}
+        for param in ("date_from", "date_to"):
+            value = request.query_params.get(param)
+            try:
+                bounds[param] = parse_date(value) if value else None
+            except ValueError:
+                bounds[param] = None
+            if value and bounds[param] is None:
+                raise ValidationError({param: "Use an ISO date."})
+        results = self.report(request_shop_id(request), period, bounds["date_from"], bounds["date_to"])
+        return Response({"period": period, "results": results})
+
+
+class ItemReportView(ReportView):
+    """
+    GET /api/reports/items/ with the same parameters, per-item sales volume
+    """
+    report = staticmethod(items_report)
@@ -0,0 +1,15 @@
+"""
+Django's SQLite backend with per-connection PRAGMAs.
+
+The PRAGMAs come from the database's PRAGMAS entry (see denitrack/database.py)
+and run as each connection is set up, before Django issues its own queries.
+Databases configured without the entry behave like the stock backend.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def init_connection_state(self):
+        super().init_connection_state()
+        for pragma, value in (self.settings_dict.get("PRAGMAS") or {}).items():
+            self.connection.execute(f"PRAGMA {pragma} = {value}")
@@ -2,6 +2,8 @@ import datetime
 import os
 from pathlib import Path
 
+from .database import database_config, env_flag
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -11,7 +13,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv("DJANGO_SECRET_KEY", "django-insecure-local-secret-key")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env_flag("DJANGO_DEBUG", False)
 
 ALLOWED_HOSTS = [
     "localhost",                
@@ -48,6 +50,12 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+# per-request query count, DB / serializer / total time as Server-Timing headers and
+# histograms at /api/_metrics/ (core.metrics), read with METRICS_TOKEN; without a token there is no endpoint
+REQUEST_METRICS = env_flag("REQUEST_METRICS", False)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'core.metrics.RequestMetricsMiddleware')
 
 CORS_ALLOWED_ORIGINS = [
     'https://deni-tracker.vercel.app', 
@@ -64,6 +72,13 @@ CSRF_COOKIE_SECURE = False
 CSRF_COOKIE_HTTPONLY = False
 
 REST_FRAMEWORK = {
+    # stateless: the user is rebuilt from the token claims, no user row is read per request (core.auth)
+    "DEFAULT_AUTHENTICATION_CLASSES": [
+        "core.auth.CachedJWTAuthentication",
+    ],
+    "DEFAULT_PERMISSION_CLASSES": [
+        "rest_framework.permissions.IsAuthenticated",
+    ],
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
@@ -73,14 +88,37 @@ REST_FRAMEWORK = {
         "rest_framework.parsers.FormParser",
     ],
 }
+# requests without an X-Shop-ID header act on this shop (the migrations create shop 1),
+# and rows created without a shop land in it; 0 disables the fallback
+DEFAULT_SHOP_ID = int(os.getenv("DEFAULT_SHOP_ID", 1))
+# word-prefix ?search= through SQLite FTS5 / Postgres pg_trgm, plain prefix match when off
+SEARCH_ACCELERATION = env_flag("SEARCH_ACCELERATION", True)
+# default page size for list endpoints, and the hard ceiling for ?page_size=
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", 50))
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", 200))
+# most transactions accepted by one POST /api/transactions/batch/
+TRANSACTION_BATCH_LIMIT = int(os.getenv("TRANSACTION_BATCH_LIMIT", 500))
+# transactions fetched per round trip while streaming ledger exports
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 2000))
+# /api/sync/: tokens start this many seconds early so in-flight writes are not missed,
+# and tombstones older than SYNC_TOMBSTONE_DAYS are purged (older tokens get a full sync)
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", 5))
+SYNC_TOMBSTONE_DAYS = int(os.getenv("SYNC_TOMBSTONE_DAYS", 90))
+# seconds a stored Idempotency-Key response is replayed for
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
 
 SIMPLE_JWT = {
-    "ACCESS_TOKEN_LIFETIME": datetime.timedelta(days=30),
+    # access tokens are trusted without a database check until they expire, keep them short-lived
+    "ACCESS_TOKEN_LIFETIME": datetime.timedelta(minutes=int(os.getenv("JWT_ACCESS_MINUTES", 15))),
     "REFRESH_TOKEN_LIFETIME": datetime.timedelta(days=90),
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": False,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_OBTAIN_SERIALIZER": "core.auth.ShopTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "core.auth.ShopTokenRefreshSerializer",
 }
+# verified access tokens remembered per process, so repeat requests skip the signature check; 0 disables
+JWT_TOKEN_CACHE_SIZE = int(os.getenv("JWT_TOKEN_CACHE_SIZE", 1024))
 
 ROOT_URLCONF = 'denitrack.urls'
 
@@ -106,13 +144,41 @@ WSGI_APPLICATION = 'denitrack.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# DATABASE_URL=postgres://... or sqlite:///..., see denitrack/database.py for the knobs
+
 DATABASES = {
+    'default': database_config(BASE_DIR),
+}
+
+
+# Cache
+# writes invalidate the cached dashboard, and that only reaches the other
+# workers through a shared cache: CACHE_URL=redis://host:6379/0 (needs the
+# redis package) or DJANGO_CACHE_DIR on a directory they all see. Without one
+# each process has its own locmem cache, so the dashboard is kept for seconds
+# rather than minutes; core.checks warns when that is raised
+
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+if CACHE_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    }
+elif os.getenv("DJANGO_CACHE_DIR"):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv("DJANGO_CACHE_DIR"),
+    }
 
+# seconds the /api/dashboard/ aggregates live in the cache between writes
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv(
+    "DASHBOARD_CACHE_TIMEOUT", 5 if CACHES['default']['BACKEND'].endswith("LocMemCache") else 300
+))
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
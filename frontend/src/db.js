@@ -8,3 +8,11 @@ db.version(1).stores({
   items: "++id, name, price, is_active",
   transactions: "++id, customer_id, transaction_type,created_at, date, synced",
 });
+
+// Rows pulled from /api/sync/, keyed by their server id. They live apart from
+// the tables above, whose ++id keys are local and would collide with them.
+db.version(2).stores({
+  server_customers: "id, name, phone",
+  server_items: "id, name",
+  server_transactions: "id, customer, date",
+});
@@ -3,7 +3,7 @@ import App from "./App.vue"
 import "./assets/main.css"
 import { router } from "./router"
 import { createPinia } from "pinia"          // ← ADD THIS
-import { syncOfflineTransactions } from "./services/offline"
+import { syncWithServer } from "./services/offline"
 import { registerSW } from "virtual:pwa-register"
 
 const pinia = createPinia()                  // ← CREATE INSTANCE
@@ -20,8 +20,8 @@ const updateSW = registerSW({
 })
 
 window.addEventListener("online", () => {
-  syncOfflineTransactions().then(() => {
-    console.log("Synced offline transactions")
+  syncWithServer().then(() => {
+    console.log("Synced with the server")
   })
 })
 
@@ -4,6 +4,8 @@ import CustomerProfile from '@/views/CustomerProfile.vue';
 import Customers from '@/views/Customers.vue';
 import Transactions from '@/views/Transactions.vue';
 import Stock from '@/views/Stock.vue';
+import Login from '@/views/Login.vue';
+import { isLoggedIn } from '@/services/api';
 
 const routes = [
   { path: '/', name: 'Dashboard', component: Dashboard },
@@ -11,6 +13,7 @@ const routes = [
   { path: "/customers", name: 'customers', component: Customers},
   { path: '/transactions', name: 'Transactions', component: Transactions },
   { path: '/stock', name: 'Stock', component: Stock },
+  { path: '/login', name: 'Login', component: Login },
 ];
 
 export const router = createRouter({
@@ -18,4 +21,9 @@ export const router = createRouter({
   routes,
 });
 
-
+// the API needs a signed-in user, so every other screen starts at the login
+router.beforeEach((to) => {
+  if (to.name !== 'Login' && !isLoggedIn()) {
+    return { name: 'Login', query: { next: to.fullPath } };
+  }
+});
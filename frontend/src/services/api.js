@@ -1,13 +1,94 @@
 const API_BASE = import.meta.env.VITE_API_BASE;
 
+// ---------- AUTH ----------
+// The API takes short-lived JWT access tokens; the refresh token gets a new one.
+const ACCESS_KEY = "deni-access-token";
+const REFRESH_KEY = "deni-refresh-token";
+
+export async function login(username, password) {
+  const res = await fetch(`${API_BASE}/token/`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ username, password }),
+  });
+  if (!res.ok) throw new Error("Invalid username or password");
+  const tokens = await res.json();
+  localStorage.setItem(ACCESS_KEY, tokens.access);
+  localStorage.setItem(REFRESH_KEY, tokens.refresh);
+}
+
+export function logout() {
+  localStorage.removeItem(ACCESS_KEY);
+  localStorage.removeItem(REFRESH_KEY);
+}
+
+async function refreshAccessToken() {
+  const refresh = localStorage.getItem(REFRESH_KEY);
+  if (!refresh) return false;
+  const res = await fetch(`${API_BASE}/token/refresh/`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ refresh }),
+  });
+  if (!res.ok) {
+    logout();
+    return false;
+  }
+  localStorage.setItem(ACCESS_KEY, (await res.json()).access);
+  return true;
+}
+
+export function isLoggedIn() {
+  return Boolean(localStorage.getItem(ACCESS_KEY) || localStorage.getItem(REFRESH_KEY));
+}
+
+// Send the user to the login screen, and back here once they have signed in.
+function redirectToLogin() {
+  if (window.location.pathname === "/login") return;
+  const next = window.location.pathname + window.location.search;
+  window.location.assign(`/login?next=${encodeURIComponent(next)}`);
+}
+
+// fetch() with the access token, refreshed once when the server rejects it.
+// A request still rejected after that means the session is over.
+export async function authFetch(url, options = {}) {
+  const send = () => {
+    const token = localStorage.getItem(ACCESS_KEY);
+    return fetch(url, {
+      ...options,
+      headers: { ...options.headers, ...(token ? { Authorization: `Bearer ${token}` } : {}) },
+    });
+  };
+  let res = await send();
+  if (res.status === 401 && await refreshAccessToken()) res = await send();
+  if (res.status === 401) {
+    logout();
+    redirectToLogin();
+  }
+  return res;
+}
+
+// The list endpoints return pages of {next, previous, results}; follow the
+// next links and return all the rows as one array.
+async function fetchAllPages(url, errorMessage) {
+  const rows = [];
+  while (url) {
+    const res = await authFetch(url);
+    if (!res.ok) throw new Error(errorMessage);
+    const page = await res.json();
+    if (Array.isArray(page)) return rows.concat(page);
+    rows.push(...page.results);
+    url = page.next;
+  }
+  return rows;
+}
+
 export async function fetchCustomers() {
-  const res = await fetch(`${API_BASE}/customers/`);
-  if (!res.ok) throw new Error("Failed to fetch customers");
-  return await res.json();
+  return fetchAllPages(`${API_BASE}/customers/`, "Failed to fetch customers");
 }
 
 export async function fetchCustomer(id) {
-  const res = await fetch(`${API_BASE}/customers/${id}/`);
+  const res = await authFetch(`${API_BASE}/customers/${id}/`);
   if (!res.ok) throw new Error("Failed to fetch customer");
   return await res.json();
 }
@@ -19,7 +100,7 @@ export async function addTransaction(customer_id, type, payload) {
     ...payload,
   };
 
-  const res = await fetch(`${API_BASE}/transactions/`, {
+  const res = await authFetch(`${API_BASE}/transactions/`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify(body),
@@ -30,7 +111,7 @@ export async function addTransaction(customer_id, type, payload) {
 }
 
 export async function addCustomer(data) {
-  const res = await fetch(`${API_BASE}/customers/`, {
+  const res = await authFetch(`${API_BASE}/customers/`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify(data),
@@ -42,13 +123,11 @@ export async function addCustomer(data) {
 
 // ---------- ITEM CRUD ----------
 export async function fetchItems() {  // ADD THIS
-  const res = await fetch(`${API_BASE}/items/`);
-  if (!res.ok) throw new Error("Failed to fetch items");
-  return await res.json();
+  return fetchAllPages(`${API_BASE}/items/`, "Failed to fetch items");
 }
 
 export async function addItem(data) {
-  const res = await fetch(`${API_BASE}/items/`, {
+  const res = await authFetch(`${API_BASE}/items/`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify(data),
@@ -58,7 +137,7 @@ export async function addItem(data) {
 }
 
 export async function updateItem(id, data) {
-  const res = await fetch(`${API_BASE}/items/${id}/`, {
+  const res = await authFetch(`${API_BASE}/items/${id}/`, {
     method: "PATCH",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify(data),
@@ -68,7 +147,7 @@ export async function updateItem(id, data) {
 }
 
 export async function deleteItem(id) {
-  const res = await fetch(`${API_BASE}/items/${id}/`, { method: "DELETE" });
+  const res = await authFetch(`${API_BASE}/items/${id}/`, { method: "DELETE" });
   if (!res.ok) throw new Error("Failed to delete item");
 }
 
@@ -82,7 +161,7 @@ export async function addDebt(customer_id, items) {
     }))
   };
 
-  const res = await fetch(`${API_BASE}/transactions/`, {
+  const res = await authFetch(`${API_BASE}/transactions/`, {
     method: "POST",
     headers: { "Content-Type": "application/json" },
     body: JSON.stringify(payload),
@@ -1,35 +1,93 @@
 import { db } from "@/db";
+import { authFetch } from "@/services/api";
 
 
 const API_BASE = import.meta.env.VITE_API_BASE;
 
 export async function queueTransaction(transaction) {
   transaction.synced = false;
+  // the server uses this key to ignore entries it has already stored
+  transaction.client_key = transaction.client_key || crypto.randomUUID();
+  transaction.date = transaction.date || new Date().toISOString();
   await db.transactions.add(transaction);
 }
 
+// The server rejects larger batches (TRANSACTION_BATCH_LIMIT in the backend settings).
+const BATCH_SIZE = 500;
+
 export async function syncOfflineTransactions() {
   const unsynced = await db.transactions.where({ synced: false }).toArray();
 
-  for (const t of unsynced) {
+  for (let start = 0; start < unsynced.length; start += BATCH_SIZE) {
+    const batch = unsynced.slice(start, start + BATCH_SIZE);
+    const entries = batch.map(t => ({
+      key: t.client_key || `local-${t.id}`,
+      customer: t.customer,
+      transaction_type: t.transaction_type,
+      // when it was recorded on the device, not when it reached the server
+      ...(t.date ? { date: t.date } : {}),
+      ...(t.transaction_type === "debt"
+        ? { items: t.items.map(i => ({ item: i.id, quantity: i.quantity })) }
+        : { amount: t.amount }),
+    }));
+
     try {
-      if (t.transaction_type === "debt") {
-        await addDebt(t.customer, t.items);
-      } else {
-        const res = await fetch(`${API_BASE}/transactions/`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({
-            customer: t.customer,
-            transaction_type: "payment",
-            amount: t.amount,
-          }),
-        });
-        if (!res.ok) throw new Error("Failed to sync payment");
+      const res = await authFetch(`${API_BASE}/transactions/batch/`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(entries),
+      });
+      if (!res.ok) throw new Error("Failed to sync transactions");
+
+      const { results } = await res.json();
+      for (const [i, result] of results.entries()) {
+        if (result.status === "error") {
+          console.warn("Sync failed for transaction:", batch[i], result.errors);
+        } else {
+          await db.transactions.update(batch[i].id, { synced: true });
+        }
       }
-      await db.transactions.update(t.id, { synced: true });
     } catch (e) {
-      console.warn("Sync failed for transaction:", t, e);
+      // the rest waits for the next sync, keys make the retry safe
+      console.warn("Sync failed:", e);
+      return;
     }
   }
 }
+
+const SYNC_TOKEN_KEY = "deni-sync-token";
+
+// Pull what changed on the server since the last pull into the server_* tables.
+// The first pull (or one after a long time offline) replaces them.
+export async function pullServerChanges() {
+  const since = localStorage.getItem(SYNC_TOKEN_KEY);
+  const query = since ? `?since=${encodeURIComponent(since)}` : "";
+  const res = await authFetch(`${API_BASE}/sync/${query}`);
+  if (!res.ok) throw new Error("Failed to fetch changes");
+  const changes = await res.json();
+
+  const tables = [db.server_customers, db.server_items, db.server_transactions];
+  await db.transaction("rw", tables, async () => {
+    if (changes.full) {
+      await Promise.all(tables.map(table => table.clear()));
+    }
+    await db.server_customers.bulkPut(changes.customers);
+    await db.server_items.bulkPut(changes.items);
+    await db.server_transactions.bulkPut(changes.transactions);
+    await db.server_customers.bulkDelete(changes.deleted.customers);
+    await db.server_items.bulkDelete(changes.deleted.items);
+    await db.server_transactions.bulkDelete(changes.deleted.transactions);
+  });
+  localStorage.setItem(SYNC_TOKEN_KEY, changes.token);
+  return changes;
+}
+
+// Push the queued transactions, then pull, so the pull already includes them.
+export async function syncWithServer() {
+  await syncOfflineTransactions();
+  try {
+    await pullServerChanges();
+  } catch (e) {
+    console.warn("Pull failed:", e);
+  }
+}